@@ -0,0 +1,170 @@
+import datetime
+import gc
+import json
+import sys
+
+EPOCH = datetime.datetime(1970, 1, 1)
+US_PER_SECOND = 1_000_000
+US_PER_DAY = 86_400 * US_PER_SECOND
+
+# Keys stored in slots; anything else in a record (metadata, error...) is kept in `extra`
+_FIELDS = frozenset(('timestamp', 'variant', 'site', 'price', 'url'))
+
+
+def to_epoch_us(value):
+    """
+    Parses an ISO timestamp into integer microseconds since the epoch.
+    Naive timestamps (as written by the scraper) are taken as-is, aware ones
+    are converted to UTC. Returns None if invalid.
+    """
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    delta = dt - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * US_PER_SECOND + delta.microseconds
+
+
+def from_epoch_us(ts):
+    """
+    Formats epoch microseconds back into the naive ISO timestamp.
+    """
+    return (EPOCH + datetime.timedelta(microseconds=ts)).isoformat()
+
+
+def iso_week(ts):
+    """
+    Returns a number identifying the ISO week (Monday to Sunday) of epoch
+    microseconds. 1970-01-01 was a Thursday, hence the 3 day shift.
+    """
+    return (ts // US_PER_DAY + 3) // 7
+
+
+def _intern(value):
+    return sys.intern(value) if value.__class__ is str else value
+
+
+class PriceRecord:
+    """
+    One price observation. The timestamp is parsed once into epoch
+    microseconds (`ts`, UTC for aware timestamps) for sorting and grouping,
+    while the original string is kept as `timestamp` and written back as is,
+    so conversion is lossless. The repeated site/variant/url strings are
+    interned, so large histories stay small.
+    """
+
+    __slots__ = ('ts', 'timestamp', 'site', 'variant', 'price', 'url', 'extra')
+
+    # Mutable, compared by value: not meant to be hashed
+    __hash__ = None
+
+    def __init__(self, ts, site, variant, price, url=None, extra=None, timestamp=None):
+        self.ts = ts
+        if timestamp is None and ts is not None:
+            timestamp = from_epoch_us(ts)
+        self.timestamp = timestamp
+        self.site = _intern(site)
+        self.variant = _intern(variant)
+        self.price = price
+        self.url = _intern(url)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a record from the JSON shape used in data/prices.json.
+        Invalid timestamps are kept verbatim (with ts None) so no data is lost.
+        """
+        # Hot path for large histories: fill the slots directly (and intern
+        # inline) instead of going through __init__ and _intern
+        record = cls.__new__(cls)
+        timestamp = data.get('timestamp')
+        record.timestamp = timestamp
+        record.ts = to_epoch_us(timestamp)
+        site = data.get('site')
+        record.site = sys.intern(site) if site.__class__ is str else site
+        variant = data.get('variant')
+        record.variant = sys.intern(variant) if variant.__class__ is str else variant
+        record.price = data.get('price')
+        url = data.get('url')
+        record.url = sys.intern(url) if url.__class__ is str else url
+        # Only the values of the other keys (metadata, error...) are kept, so
+        # the source dict and its own copies of the strings can be freed
+        extra_keys = data.keys() - _FIELDS
+        if not extra_keys:
+            record.extra = None
+        elif len(extra_keys) == 1:
+            key, = extra_keys
+            record.extra = {key: data[key]}
+        else:
+            record.extra = {k: v for k, v in data.items() if k not in _FIELDS}
+        return record
+
+    def to_dict(self):
+        """
+        Returns the JSON shape used in data/prices.json.
+        """
+        data = {}
+        if self.timestamp is not None:
+            data['timestamp'] = self.timestamp
+        if self.variant is not None:
+            data['variant'] = self.variant
+        if self.site is not None:
+            data['site'] = self.site
+        data['price'] = self.price
+        if self.url is not None:
+            data['url'] = self.url
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, PriceRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PriceRecord({self.timestamp!r}, {self.site!r}, {self.variant!r}, {self.price!r})"
+
+
+def load_records(history):
+    """
+    Converts a JSON history (list of dicts) into PriceRecords.
+    """
+    return [PriceRecord.from_dict(record) for record in history]
+
+
+def _record_hook(data):
+    # Called for every JSON object, innermost first: only history entries
+    # (never the nested metadata) carry both a site and a price
+    if 'site' in data and 'price' in data:
+        return PriceRecord.from_dict(data)
+    return data
+
+
+def read_records(f):
+    """
+    Parses a JSON history file straight into PriceRecords. Each entry's dict
+    is dropped as soon as its record is built, so the whole history never
+    exists twice in memory.
+    """
+    # Parsing only builds acyclic objects: pausing the cyclic GC avoids the
+    # collections triggered over and over by hundreds of thousands of new containers
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        history = json.load(f, object_hook=_record_hook)
+        # Entries that did not look like a record (no site) are converted as usual
+        return [r if r.__class__ is PriceRecord else PriceRecord.from_dict(r) for r in history]
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump_records(records):
+    """
+    Converts PriceRecords back into the JSON history shape.
+    """
+    return [record.to_dict() for record in records]
@@ -1,21 +1,38 @@
+import argparse
 import json
 import re
 import datetime
 import asyncio
+import functools
 import requests
 from playwright.async_api import async_playwright
 import os
 
+from records import dump_records, iso_week, load_records, read_records, to_epoch_us
+from stats import WINDOWS, load_stats, save_stats
+from strategies import STRATEGY_FILE, StrategyCache
+
 CONFIG_FILE = 'config.json'
 DATA_FILE = 'data/prices.json'
 
 # Compile regex at module level for performance
 COUPON_PATTERN = re.compile(r'(GMK\w+)')
 PRICE_CLEAN_PATTERN = re.compile(r'[^\d.,]')
+SLUG_PATTERN = re.compile(r'[^a-z0-9]+')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Per-site browser storage state (cookies, localStorage with region/language choice)
+STATE_DIR = '.cache/storage_state'
 
-async def send_telegram_alert(item, price):
+# Time given to the page to settle after load/clicks. Replayed pages are
+# served locally, so a much shorter wait is enough.
+SETTLE_MS = 2000
+REPLAY_SETTLE_MS = 250
+
+async def send_telegram_alert(item, price, series_stats=None):
     """
-    Sends a Telegram alert when price drops below target.
+    Sends a Telegram alert when price drops below target or hits a new low.
     """
     variant = item.get('target_ram', item.get('variant', 'Unknown'))
     site_name = item.get('site_name')
@@ -29,12 +46,22 @@ async def send_telegram_alert(item, price):
         print("Skipping Telegram alert: TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set.")
         return
 
+    lows = ""
+    if series_stats:
+        for days in WINDOWS:
+            entry = series_stats.rolling_min(days)
+            if entry:
+                lows += f"📉 **Mínimo {days} días:** {entry['price']} €\n"
+        if series_stats.all_time_min:
+            lows += f"🏆 **Mínimo Histórico:** {series_stats.all_time_min['price']} €\n"
+
     message = (
         f"🚨 **BAJADA DE PRECIO** 🚨\n\n"
         f"📦 **Producto:** GMKtec EVO-X2 ({variant})\n"
         f"🏪 **Tienda:** {site_name}\n"
         f"💰 **Precio Actual:** {price} €\n"
-        f"🎯 **Objetivo:** {target_price} €\n\n"
+        f"🎯 **Objetivo:** {target_price} €\n"
+        f"{lows}\n"
         f"🔗 [Ver Oferta]({url})"
     )
 
@@ -87,268 +114,554 @@ def parse_price(price_str):
     except ValueError:
         return None
 
-async def remove_geo_modal(page):
+def settle_timeout(item):
+    """
+    Returns how long (ms) to wait for the page to settle for this item.
+    """
+    return REPLAY_SETTLE_MS if item.get('replay') else SETTLE_MS
+
+def slugify(name):
+    return SLUG_PATTERN.sub('-', name.lower()).strip('-')
+
+def har_path(har_dir, item):
+    """
+    Returns the HAR archive path used to record/replay an item's traffic.
+    """
+    variant = item.get('target_ram', item.get('variant', 'Unknown'))
+    return os.path.join(har_dir, f"{slugify(item.get('site_name', 'site'))}-{slugify(variant)}.har")
+
+def storage_state_path(site_name, state_dir=STATE_DIR):
+    """
+    Returns the path where a site's browser storage state is persisted.
+    """
+    return os.path.join(state_dir, f"{slugify(site_name or 'site')}.json")
+
+def known_good_path(site_name, state_dir=STATE_DIR):
     """
-    Attempts to close/remove the Geolocation/Language modal and other blockers.
+    Returns the marker file saying a site's storage state got through a run
+    without blockers. Only then is it trusted enough to skip waiting for them.
+    """
+    return os.path.join(state_dir, f"{slugify(site_name or 'site')}.known-good")
+
+async def remove_geo_modal(page, timeout=SETTLE_MS):
+    """
+    Dismisses the Geolocation/Language modal and removes other overlays.
+    The modal is answered through its own "stay" button (or its close control)
+    first, so the site stores the region/language choice in the storage state;
+    whatever is left is removed from the DOM. With timeout=0 (known-good storage
+    state) it does not wait for it to appear. Returns True if the geo modal was
+    present; generic overlays are removed but not reported, as some themes
+    always render them.
     """
     # "ts-geo-modal" intercepts pointer events
-    # Wait a bit for it to appear (up to 2s), but proceed immediately if found
-    blocker_selector = '#ts-geo-modal, .ts-geo-modal__backdrop, #ts-geo, .popup-overlay, .modal-backdrop'
-    try:
-        await page.wait_for_selector(blocker_selector, timeout=2000, state='attached')
-    except Exception:
-        # Timeout means not found within 2s, proceed anyway to cleanup attempts
-        pass
+    # Wait a bit for it to appear (up to timeout), but proceed immediately if found
+    if timeout:
+        try:
+            await page.wait_for_selector('#ts-geo-modal, #ts-geo', timeout=timeout, state='attached')
+        except Exception:
+            # Timeout means not found in time, proceed anyway to cleanup attempts
+            pass
 
     try:
-        # Try to find a close button or similar
-        # Or just remove the element from DOM
-        await page.evaluate("""
-            const removeElement = (sel) => {
-                const el = document.querySelector(sel);
-                if (el) el.remove();
-            };
-            removeElement('#ts-geo-modal');
-            removeElement('.ts-geo-modal__backdrop');
-            removeElement('#ts-geo');
-            // Also remove any other potential overlays
-            removeElement('.popup-overlay');
-            removeElement('.modal-backdrop');
+        result = await page.evaluate("""
+            () => {
+                let dismissed = false;
+                let removed = 0;
+                const modal = document.querySelector('#ts-geo-modal, #ts-geo');
+                if (modal) {
+                    // Stay on this store first, then plain close. Never "continue", which
+                    // usually leads to another regional store; short words only as whole labels
+                    const buttons = Array.from(modal.querySelectorAll('button, [role="button"], input[type="submit"]'));
+                    const labelOf = b => (b.innerText || b.value || '').trim();
+                    const stay = buttons.find(b => /\\b(stay|keep|quedarme|quedarse|permanecer|mantener)\\b/i.test(labelOf(b)));
+                    const close = modal.querySelector('[aria-label*="close" i], [aria-label*="cerrar" i], [class*="close"]');
+                    const accept = buttons.find(b => /^(ok|aceptar|accept|guardar|save)$/i.test(labelOf(b)));
+                    const control = stay || close || accept;
+                    if (control) {
+                        control.click();
+                        dismissed = true;
+                    }
+                }
+                // Remove whatever the click did not close
+                const removeElement = (sel) => {
+                    const el = document.querySelector(sel);
+                    if (el) {
+                        el.remove();
+                        removed++;
+                    }
+                };
+                removeElement('#ts-geo-modal');
+                removeElement('.ts-geo-modal__backdrop');
+                removeElement('#ts-geo');
+                // Also remove any other potential overlays
+                removeElement('.popup-overlay');
+                removeElement('.modal-backdrop');
+                return {geo: !!modal, dismissed, removed};
+            }
         """)
-        print("Removed geo modal/blockers.")
+        if result['dismissed']:
+            print("Dismissed geo modal through its own control.")
+        if result['removed']:
+            print(f"Removed {result['removed']} geo modal/blocker elements.")
+        return bool(result['geo'])
     except Exception as e:
         print(f"Error removing modal: {e}")
+        return False
+
+async def extract_structured_variants(page):
+    """
+    Reads every variant price embedded in the page (Shopify product JSON,
+    ShopifyAnalytics meta, JSON-LD offers) in a single evaluate.
+    Returns a list of (label, price) in page order, first source wins per label.
+    """
+    sources = await page.evaluate("""
+        () => {
+            const sources = [];
+            const parse = (text) => {
+                try { return JSON.parse(text); } catch (e) { return null; }
+            };
+            const optionsOf = (v) => v.options || [v.option1, v.option2, v.option3].filter(Boolean);
+
+            // Shopify product JSON embedded by the theme
+            document.querySelectorAll('script[type="application/json"]').forEach(el => {
+                const data = parse(el.textContent);
+                const product = data && (data.product || data);
+                if (product && Array.isArray(product.variants)) {
+                    sources.push({kind: 'shopify', variants: product.variants.map(v => ({
+                        title: v.title || v.public_title || v.name || '',
+                        options: optionsOf(v),
+                        price: v.price
+                    }))});
+                }
+            });
+
+            // Shopify analytics metadata (prices in cents)
+            const meta = window.ShopifyAnalytics && window.ShopifyAnalytics.meta && window.ShopifyAnalytics.meta.product;
+            if (meta && Array.isArray(meta.variants)) {
+                sources.push({kind: 'shopify', variants: meta.variants.map(v => ({
+                    title: v.public_title || v.name || '',
+                    options: [],
+                    price: v.price
+                }))});
+            }
+
+            // JSON-LD offers, including ProductGroup variants
+            const isType = (node, type) => node && [].concat(node['@type']).includes(type);
+            const offersOf = (node) => [].concat(node.offers || []).flatMap(o => o.offers ? [].concat(o.offers) : [o]);
+            document.querySelectorAll('script[type="application/ld+json"]').forEach(el => {
+                const data = parse(el.textContent);
+                if (!data) return;
+                const nodes = [].concat(data['@graph'] || data);
+                nodes.forEach(node => {
+                    const variants = [];
+                    if (isType(node, 'ProductGroup')) {
+                        [].concat(node.hasVariant || []).forEach(v => {
+                            offersOf(v).forEach(o => variants.push({title: v.name || v.sku || '', options: [], price: o.price}));
+                        });
+                    } else if (isType(node, 'Product')) {
+                        offersOf(node).forEach(o => variants.push({title: o.name || o.sku || '', options: [], price: o.price}));
+                    }
+                    if (variants.length) sources.push({kind: 'jsonld', variants});
+                });
+            });
+            return sources;
+        }
+    """)
+    return normalize_structured_variants(sources)
+
+def normalize_structured_variants(sources):
+    """
+    Flattens the raw sources read by extract_structured_variants into
+    (label, price) pairs. Shopify integer prices are in cents.
+    """
+    variants = []
+    seen = set()
+    for source in sources or []:
+        for v in source.get('variants', []):
+            label = ' '.join([v.get('title') or ''] + [str(o) for o in v.get('options') or []]).strip()
+            price = v.get('price')
+            if isinstance(price, str):
+                price = parse_price(price)
+            elif isinstance(price, int) and source.get('kind') == 'shopify':
+                price = price / 100
+            if not label or not price or label in seen:
+                continue
+            seen.add(label)
+            variants.append((label, float(price)))
+    return variants
+
+@functools.lru_cache(maxsize=None)
+def compile_variant_pattern(pattern):
+    """
+    Compiles a config 'variant_pattern' once per run. An invalid one is
+    reported (once) and None returned, so matching falls back to target_ram.
+    """
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        print(f"Invalid variant_pattern {pattern!r}: {e}. Matching by target_ram instead.")
+        return None
+
+def match_structured_variant(variants, item):
+    """
+    Returns the price of the first variant matching the item, or None.
+    Matches the optional 'variant_pattern' regex from the config, otherwise
+    the target_ram/variant text (case and whitespace insensitive).
+    """
+    regex = compile_variant_pattern(item.get('variant_pattern'))
+    if regex:
+        matches = lambda label: regex.search(label)
+    else:
+        target = (item.get('target_ram') or item.get('variant') or '').lower().replace(" ", "")
+        if not target:
+            return None
+        matches = lambda label: target in label.lower().replace(" ", "")
+
+    for label, price in variants:
+        if matches(label):
+            print(f"Matched structured variant: '{label}' -> {price}")
+            return price
+    return None
+
+async def read_structured_variants(page):
+    """
+    Same as extract_structured_variants(), but returns [] if the page could not be read.
+    """
+    try:
+        variants = await extract_structured_variants(page)
+    except Exception as e:
+        print(f"Error reading structured data: {e}")
+        return []
+    if variants:
+        print(f"Structured data lists {len(variants)} variants.")
+    else:
+        print("No structured variant data found.")
+    return variants
+
+def structured_price(variants, item):
+    """
+    Prices the item's variant from already read embedded product data, without
+    clicking. Returns None if the data has no usable price for it.
+    """
+    price = match_structured_variant(variants, item) if variants else None
+    if price and price > 100: # Sanity check
+        return price
+    return None
 
-async def scrape_gmktec_official(page, item):
+async def select_variant_by_label(page, target_ram, settle_ms=SETTLE_MS):
+    """
+    Clicks the visible label whose text contains the target RAM (case and
+    whitespace insensitive). Returns True if one was clicked.
+    """
+    # Try to find all labels
+    labels = await page.query_selector_all('label')
+
+    # Find the match in a single evaluate instead of one round trip per label
+    match_index = await page.evaluate("""
+        (target) => {
+            const labels = Array.from(document.querySelectorAll('label'));
+            for (let i = 0; i < labels.length; i++) {
+                const label = labels[i];
+                const isVisible = !!(label.offsetWidth || label.offsetHeight || label.getClientRects().length);
+                if (isVisible) {
+                    const text = label.innerText.toLowerCase().replace(/\\s/g, "");
+                    if (text.includes(target)) {
+                        return i;
+                    }
+                }
+            }
+            return -1;
+        }
+    """, target_ram.lower().replace(" ", ""))
+
+    if match_index == -1:
+        print("No visible label matched.")
+        return False
+
+    label = labels[match_index]
+    text = await label.inner_text()
+    print(f"Found visible variant label: '{text.strip()}' -> Clicking")
+    await label.click()
+    await page.wait_for_timeout(settle_ms)
+    return True
+
+async def select_variant_by_radio(page, target_ram, settle_ms=SETTLE_MS):
+    """
+    Force-clicks the (possibly hidden) radio input whose value contains the
+    target RAM. Returns True if one was clicked.
+    """
+    normalized_target = target_ram.lower().replace(" ", "")
+    inputs = await page.query_selector_all('input[type="radio"]')
+    for inp in inputs:
+        val = await inp.get_attribute('value')
+        if val and normalized_target in val.lower().replace(" ", ""):
+            print(f"Found input with value: '{val}' -> Force Clicking")
+            await inp.click(force=True)
+            await page.wait_for_timeout(settle_ms)
+            return True
+
+    print("No radio input matched.")
+    return False
+
+async def price_from_subtotal(page):
+    """
+    Reads the selected variant's price from the "Subtotal" block. Returns None if absent.
+    """
+    # Based on inspection: "Subtotal: 1.859,00 €"
+    # We look for an element containing "Subtotal" and extract the price from it or its parent
+    subtotal_el = page.get_by_text("Subtotal", exact=False).first
+    if not await subtotal_el.is_visible():
+        return None
+
+    # Get text of parent to catch "Subtotal: 1234 €" if they are in same block
+    # or the element itself
+    text = await subtotal_el.inner_text()
+    # If text is just "Subtotal:", try parent or next sibling
+    if len(text.strip()) < 15:
+        text = await subtotal_el.evaluate("el => el.parentElement.innerText")
+
+    print(f"Found Subtotal text: {text.strip()}")
+    matches = re.findall(r'€\s?[\d.,]+|[\d.,]+\s?€', text)
+    for m in matches:
+        v = parse_price(m)
+        if v and v > 100: # Sanity check
+            print(f"Extracted base price from Subtotal: {v}")
+            return v
+    return None
+
+async def price_from_product_area(page):
+    """
+    Returns the lowest plausible price in the main product area (or the whole
+    body). The displayed prices include original vs sale, so the lowest wins.
+    """
+    main_product = await page.query_selector('.product-main, .product-info')
+    if main_product:
+         price_text = await main_product.inner_text()
+    else:
+         price_text = await page.inner_text('body')
+
+    prices_found = []
+    matches = re.findall(r'€\s?[\d.,]+|[\d.,]+\s?€', price_text)
+    for m in matches:
+        v = parse_price(m)
+        # Filter out "159" (menu/flash deals) and small amounts
+        # We know this product is expensive (>1000€ usually, or at least >500)
+        if v and v > 500:
+            prices_found.append(v)
+
+    if not prices_found:
+        return None
+    base_price = min(prices_found)
+    print(f"Fallback base price (min > 500): {base_price}")
+    return base_price
+
+def apply_coupons(full_text):
+    """
+    Finds coupon codes in the page text and applies their discount.
+    Returns (discount_amount, unique_coupons).
+    """
+    # User mentioned: "GMK20" or similar text.
+    # We'll search for common coupon patterns in the text.
+    # "Code: XXX" or just "XXXOFF"
+    # The user said: "lee el codigo y su descuento y aplicalo al precio del producto"
+
+    discount_amount = 0
+
+    # Search for explicit codes mentioned in the page text
+    # Regex for common coupon patterns: GMK\w+ (like GMKEVO50OFF)
+    # Inspect found: "GMKEVO50OFF"
+
+    # Look for the specific code pattern seen in inspection
+    # "GMKEVO50OFF" -> likely 50 OFF (currency? percentage?)
+    # "Save €20 when you buy 2" -> User said ignore bulk discounts.
+
+    # Heuristic: Find codes like "GMK..." followed by numbers
+    coupon_matches = COUPON_PATTERN.findall(full_text)
+    unique_coupons = set(coupon_matches)
+
+    for coupon in unique_coupons:
+        print(f"Found potential coupon: {coupon}")
+        # Try to infer value from coupon name
+        # GMKEVO50OFF -> 50 OFF. Is it % or €?
+        # Usually if it's 50OFF it might be 50 currency units or 50%
+        # Given the price (1500+), 50% is huge, 50€ is more likely for a generic "50OFF" code unless specified.
+        # But let's look at context text around the coupon.
+
+        # Simple logic for now:
+        # If "50OFF" in name -> assume 50€ discount (safer bet for tech products than 50%)
+        # If "5OFF" -> 5%?
+
+        # User said: "aplicalos al precio"
+        # If I can't be sure, I should probably just log it or apply a safe heuristic.
+
+        # Let's try to parse "50OFF"
+        match_val = re.search(r'(\d+)OFF', coupon)
+        if match_val:
+            val = float(match_val.group(1))
+            # Heuristic: if val > 100, unlikely to be %, assume currency.
+            # If val < 100, ambiguous.
+            # Inspect text nearby?
+            # "Top deals under €159, Save €20 when you buy 2..."
+
+            # Let's assume currency for GMK coupons on this site based on "Save €20" context elsewhere.
+            print(f"Applying coupon {coupon}: -{val}")
+            discount_amount += val
+
+    return discount_amount, unique_coupons
+
+def gmktec_record(item, base_price, full_text, strategy, layout_changed):
+    """
+    Builds the GMKtec record: applies the coupons found in full_text to base_price.
+    """
+    discount_amount, unique_coupons = apply_coupons(full_text)
+
+    final_price = base_price - discount_amount
+    print(f"Final Price: {final_price} (Base: {base_price} - Discount: {discount_amount})")
+
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "variant": item.get('target_ram'),
+        "site": item.get('site_name'),
+        "price": final_price,
+        "url": item.get('url'),
+        "metadata": {
+            "base_price": base_price,
+            "discount_applied": discount_amount,
+            "coupons_found": list(unique_coupons),
+            "strategy": strategy,
+            "layout_changed": layout_changed
+        }
+    }
+
+async def scrape_gmktec_official(page, item, strategies=None, product_pages=None):
     """
     Specific scraping logic for official GMKtec site.
-    Handles variant selection (RAM) and coupon application.
+    Prices the variant (RAM) from the embedded product data, falling back to
+    clicking the variant widgets (whichever worked last time first), then applies coupons.
+    - product_pages: {url: future of (variants, body text)} shared by the items of
+      a run, so items on the same product page are priced from one page load.
     """
     url = item.get('url')
     target_ram = item.get('target_ram') # e.g. "96GB", "128GB"
     site_name = item.get('site_name')
+    settle_ms = settle_timeout(item)
+    # Strategies are learned per variant: the embedded data may list only some
+    # of a page's variants, so items of one site can legitimately differ
+    variant_stage = f"variant:{target_ram}"
+    price_stage = f"price:{target_ram}"
+    if strategies is None:
+        strategies = StrategyCache()
+    if product_pages is None:
+        product_pages = {}
 
     print(f"Scraping GMKtec Official for {target_ram} RAM...")
 
+    loaded = product_pages.get(url)
     try:
+        if loaded is not None:
+            # Another item already loads this page: its embedded data usually lists our variant too
+            variants, full_text = await loaded
+            base_price = structured_price(variants, item) if full_text is not None else None
+            if base_price:
+                print(f"Base price found: {base_price} (from the page already loaded for {url})")
+                return gmktec_record(
+                    item, base_price, full_text,
+                    {"variant": "structured", "price": "structured"},
+                    strategies.layout_changed(site_name, {variant_stage: 'structured'})
+                )
+            print(f"Variant {target_ram} not in the shared page data. Loading it separately...")
+        else:
+            loaded = product_pages[url] = asyncio.get_running_loop().create_future()
+
         await page.goto(url, timeout=60000)
 
+        async def dismiss_blockers(timeout):
+            if await remove_geo_modal(page, timeout=timeout):
+                item['blocker_seen'] = True
+
         # 0. Close Geolocation/Language Modal if present
-        await remove_geo_modal(page)
+        # Skip waiting for it when a known-good storage state was loaded
+        await dismiss_blockers(0 if item.get('storage_state_known_good') else settle_ms)
+        item['blocker_checked'] = True
 
-        # 1. Select Variant
-        # Find label containing the target RAM
-        # We look for a label text that contains the target RAM string (case insensitive)
-        print(f"Looking for variant: {target_ram}")
+        # Everything the other items of this page need, read once
+        variants = await read_structured_variants(page)
+        full_text = await page.inner_text('body')
+        if not loaded.done():
+            loaded.set_result((variants, full_text))
 
-        # Wait a bit for dynamic content
-        await page.wait_for_timeout(2000)
-
-        # Try to find all labels
-        labels = await page.query_selector_all('label')
-        variant_clicked = False
-
-        # Strategy 1: Click Visible Labels (Optimized with page.evaluate)
-        match_index = await page.evaluate("""
-            (target) => {
-                const labels = Array.from(document.querySelectorAll('label'));
-                for (let i = 0; i < labels.length; i++) {
-                    const label = labels[i];
-                    const isVisible = !!(label.offsetWidth || label.offsetHeight || label.getClientRects().length);
-                    if (isVisible) {
-                        const text = label.innerText.toLowerCase().replace(/\\s/g, "");
-                        if (text.includes(target)) {
-                            return i;
-                        }
-                    }
-                }
-                return -1;
-            }
-        """, target_ram.lower().replace(" ", ""))
-
-        if match_index != -1:
-            label = labels[match_index]
-            text = await label.inner_text()
-            print(f"Found visible variant label: '{text.strip()}' -> Clicking")
-            await label.click()
-            variant_clicked = True
-            await page.wait_for_timeout(2000)
-
-        # Strategy 2: Click Hidden Radio Inputs directly (force)
-        if not variant_clicked:
-            print("No visible label matched. Trying inputs...")
-            inputs = await page.query_selector_all('input[type="radio"]')
-            for inp in inputs:
-                val = await inp.get_attribute('value')
-                if val:
-                    normalized_val = val.lower().replace(" ", "")
-                    normalized_target = target_ram.lower().replace(" ", "")
-                    if normalized_target in normalized_val:
-                        print(f"Found input with value: '{val}' -> Force Clicking")
-                        await inp.click(force=True)
-                        variant_clicked = True
-                        await page.wait_for_timeout(2000)
-                        break
-
-        if not variant_clicked:
+        # 1. Select the variant: the embedded product data prices it directly,
+        # the widgets need a click and then a read of the rendered price
+        print(f"Looking for variant: {target_ram}")
+        settled = False
+
+        async def from_structured():
+            return structured_price(variants, item)
+
+        async def click_variant(select):
+            nonlocal settled
+            if not settled:
+                # Wait a bit for dynamic content before the first click,
+                # then clear any blocker injected meanwhile so it cannot eat the click
+                await page.wait_for_timeout(settle_ms)
+                await dismiss_blockers(0)
+                settled = True
+            return await select(page, target_ram, settle_ms)
+
+        variant_strategy, variant_result = await strategies.run(site_name, variant_stage, {
+            'structured': from_structured,
+            'label': lambda: click_variant(select_variant_by_label),
+            'radio': lambda: click_variant(select_variant_by_radio),
+        }, probe=('structured',))
+
+        if not variant_strategy:
             print(f"Variant {target_ram} not found!")
             return None
 
         # 2. Get Base Price
-        # Selector for price on this site seems to be .price__current or similar
-        # Based on inspection, it might be just .price or similar container.
-        # Let's try a few common Shopify selectors
-        price_selector = '.product__price, .price__current, .price-item--regular'
-        # But wait, inspection showed potential price element found: €2.199,00 \n €1.589,00
-        # Usually the "sale price" is what we want.
-
-        # Let's try to find the price container again
-        price_el = await page.query_selector('.price__current')
-        if not price_el:
-             price_el = await page.query_selector('.product-info__price')
-
-        if not price_el:
-             # Fallback to searching by text content relative to "Total" or similar if needed,
-             # but let's assume standard selectors first.
-             # Inspection log showed: "Potential price element found: €2.199,00\n€1.589,00"
-             # It seems there are multiple price elements (original vs sale).
-             # We want the lowest one visible in the main product area.
-             pass
-
-        # Strategy: Look for "Subtotal" or similar explicit price indicators first
-        base_price = None
-
-        # Try to find "Subtotal" element
-        # Based on inspection: "Subtotal: 1.859,00 €"
-        # We look for an element containing "Subtotal" and extract the price from it or its parent
-        try:
-            subtotal_el = page.get_by_text("Subtotal", exact=False).first
-            if await subtotal_el.is_visible():
-                # Get text of parent to catch "Subtotal: 1234 €" if they are in same block
-                # or the element itself
-                text = await subtotal_el.inner_text()
-                # If text is just "Subtotal:", try parent or next sibling
-                if len(text.strip()) < 15:
-                    parent_text = await subtotal_el.evaluate("el => el.parentElement.innerText")
-                    text = parent_text
-
-                print(f"Found Subtotal text: {text.strip()}")
-                matches = re.findall(r'€\s?[\d.,]+|[\d.,]+\s?€', text)
-                for m in matches:
-                    v = parse_price(m)
-                    if v and v > 100: # Sanity check
-                        base_price = v
-                        print(f"Extracted base price from Subtotal: {base_price}")
-                        break
-        except Exception as e:
-            print(f"Error finding subtotal: {e}")
-
-        # Fallback: Find all prices in main product area if Subtotal failed
-        if not base_price:
-            print("Subtotal not found, falling back to all prices...")
-            main_product = await page.query_selector('.product-main, .product-info')
-            if main_product:
-                 price_text = await main_product.inner_text()
-            else:
-                 price_text = await page.inner_text('body')
-
-            prices_found = []
-            matches = re.findall(r'€\s?[\d.,]+|[\d.,]+\s?€', price_text)
-            for m in matches:
-                v = parse_price(m)
-                # Filter out "159" (menu/flash deals) and small amounts
-                # We know this product is expensive (>1000€ usually, or at least >500)
-                if v and v > 500:
-                    prices_found.append(v)
-
-            if prices_found:
-                base_price = min(prices_found)
-                print(f"Fallback base price (min > 500): {base_price}")
+        winners = {variant_stage: variant_strategy}
+        if variant_strategy == 'structured':
+            price_strategy, base_price = 'structured', variant_result
+        else:
+            # The subtotal is exact and only a read: always try it before the
+            # looser product area scan, even after the latter won
+            price_strategy, base_price = await strategies.run(site_name, price_stage, {
+                'subtotal': lambda: price_from_subtotal(page),
+                'product_area': lambda: price_from_product_area(page),
+            }, probe=('subtotal',))
+            winners[price_stage] = price_strategy
 
         if not base_price:
             print("No valid price found on page.")
             return None
-        print(f"Base price found: {base_price}")
+        # A modal injected after the first check still means the state is not good yet
+        await dismiss_blockers(0)
+        print(f"Base price found: {base_price} (strategies: {variant_strategy}/{price_strategy})")
 
         # 3. Check for coupons
-        # User mentioned: "GMK20" or similar text.
-        # We'll search for common coupon patterns in the text.
-        # "Code: XXX" or just "XXXOFF"
-        # The user said: "lee el codigo y su descuento y aplicalo al precio del producto"
-
-        discount_amount = 0
-
-        # Search for explicit codes mentioned in the page text
-        # Regex for common coupon patterns: GMK\w+ (like GMKEVO50OFF)
-        # Inspect found: "GMKEVO50OFF"
-
-        full_text = await page.inner_text('body')
-
-        # Look for the specific code pattern seen in inspection
-        # "GMKEVO50OFF" -> likely 50 OFF (currency? percentage?)
-        # "Save €20 when you buy 2" -> User said ignore bulk discounts.
-
-        # Heuristic: Find codes like "GMK..." followed by numbers
-        coupon_matches = COUPON_PATTERN.findall(full_text)
-        unique_coupons = set(coupon_matches)
-
-        for coupon in unique_coupons:
-            print(f"Found potential coupon: {coupon}")
-            # Try to infer value from coupon name
-            # GMKEVO50OFF -> 50 OFF. Is it % or €?
-            # Usually if it's 50OFF it might be 50 currency units or 50%
-            # Given the price (1500+), 50% is huge, 50€ is more likely for a generic "50OFF" code unless specified.
-            # But let's look at context text around the coupon.
-
-            # Simple logic for now:
-            # If "50OFF" in name -> assume 50€ discount (safer bet for tech products than 50%)
-            # If "5OFF" -> 5%?
-
-            # User said: "aplicalos al precio"
-            # If I can't be sure, I should probably just log it or apply a safe heuristic.
-
-            # Let's try to parse "50OFF"
-            match_val = re.search(r'(\d+)OFF', coupon)
-            if match_val:
-                val = float(match_val.group(1))
-                # Heuristic: if val > 100, unlikely to be %, assume currency.
-                # If val < 100, ambiguous.
-                # Inspect text nearby?
-                # "Top deals under €159, Save €20 when you buy 2..."
-
-                # Let's assume currency for GMK coupons on this site based on "Save €20" context elsewhere.
-                print(f"Applying coupon {coupon}: -{val}")
-                discount_amount += val
-
-        final_price = base_price - discount_amount
-        print(f"Final Price: {final_price} (Base: {base_price} - Discount: {discount_amount})")
-
-        # Alert Check
-        target_price = item.get('target_price')
-        if target_price and final_price <= target_price:
-            print(f"Price {final_price} is below target {target_price}! Sending alert...")
-            await send_telegram_alert(item, final_price)
-
-        return {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "variant": target_ram,
-            "site": site_name,
-            "price": final_price,
-            "url": url,
-            "metadata": {
-                "base_price": base_price,
-                "discount_applied": discount_amount,
-                "coupons_found": list(unique_coupons)
-            }
-        }
+        return gmktec_record(
+            item, base_price, full_text,
+            {"variant": variant_strategy, "price": price_strategy},
+            strategies.layout_changed(site_name, winners)
+        )
 
     except Exception as e:
         print(f"Error scraping GMKtec {target_ram}: {e}")
         return None
+    finally:
+        # Never leave the items waiting on this page hanging
+        if loaded is not None and not loaded.done():
+            loaded.set_result(([], None))
+
+def record_sort_key(record):
+    # Records without a valid timestamp sort first
+    return record.ts if record.ts is not None else -1 << 62
 
 def clean_price_history(history_data, reference_date=None):
     """
-    Cleans up history data.
+    Cleans up history data (a list of PriceRecord).
     - Keeps all records from the last 2 weeks (relative to reference_date).
     - For older records, keeps only the lowest price record per week per variant.
     """
@@ -358,69 +671,53 @@ def clean_price_history(history_data, reference_date=None):
     if reference_date is None:
         reference_date = datetime.datetime.now()
 
-    cutoff_date = reference_date - datetime.timedelta(weeks=2)
+    # Assuming naive timestamps as per existing data
+    cutoff = to_epoch_us((reference_date - datetime.timedelta(weeks=2)).isoformat())
 
     recent_data = []
     old_data = []
 
     for record in history_data:
-        try:
-            ts = datetime.datetime.fromisoformat(record['timestamp'])
-            # Assuming naive timestamps as per existing data
-            if ts >= cutoff_date:
-                recent_data.append(record)
-            else:
-                old_data.append(record)
-        except (ValueError, KeyError):
-            # If timestamp is invalid or missing, keep it in recent to avoid data loss
+        # If timestamp is invalid or missing, keep it in recent to avoid data loss
+        if record.ts is None or record.ts >= cutoff:
             recent_data.append(record)
+        else:
+            old_data.append(record)
 
     if not old_data:
-        return sorted(recent_data, key=lambda x: x.get('timestamp', ''))
+        return sorted(recent_data, key=record_sort_key)
 
-    # Process old data: Group by (variant, site, year, week)
+    # Process old data: Group by (variant, site, ISO week)
     grouped = {}
     for record in old_data:
-        try:
-            ts = datetime.datetime.fromisoformat(record['timestamp'])
-            year, week, _ = ts.isocalendar()
-            variant = record.get('variant', 'Unknown')
-            site = record.get('site', 'Unknown')
-
-            key = (variant, site, year, week)
+        key = (record.variant, record.site, iso_week(record.ts))
 
-            if key not in grouped:
+        current_min = grouped.get(key)
+        if current_min is None:
+            grouped[key] = record
+        else:
+            # Keep the one with lower price
+            # specific logic: if price is None, treat as infinite (worst)
+            p_current = current_min.price
+            p_new = record.price
+            if p_current is None: p_current = float('inf')
+            if p_new is None: p_new = float('inf')
+
+            if p_new < p_current:
                 grouped[key] = record
-            else:
-                # Keep the one with lower price
-                current_min = grouped[key]
-                p_current = current_min.get('price')
-                p_new = record.get('price')
-
-                # specific logic: if price is None, treat as infinite (worst)
-                if p_current is None: p_current = float('inf')
-                if p_new is None: p_new = float('inf')
-
-                if p_new < p_current:
-                    grouped[key] = record
-        except Exception:
-             # If error processing, keep it safe
-             recent_data.append(record)
-
-    cleaned_old_data = list(grouped.values())
 
     # Merge and sort
-    final_history = recent_data + cleaned_old_data
-    final_history.sort(key=lambda x: x.get('timestamp', ''))
+    final_history = recent_data + list(grouped.values())
+    final_history.sort(key=record_sort_key)
 
     return final_history
 
-async def scrape_site(page, item):
+async def scrape_site(page, item, strategies=None, product_pages=None):
     """
     Scrapes a single item. Dispatches to specific logic if needed.
     """
     if item.get('type') == 'gmktec_official':
-        return await scrape_gmktec_official(page, item)
+        return await scrape_gmktec_official(page, item, strategies, product_pages)
 
     url = item.get('url')
     selector = item.get('selector')
@@ -443,12 +740,6 @@ async def scrape_site(page, item):
             price = parse_price(text)
             print(f"Found price: {price}")
 
-            # Alert Check
-            target_price = item.get('target_price')
-            if price and target_price and price <= target_price:
-                print(f"Price {price} is below target {target_price}! Sending alert...")
-                await send_telegram_alert(item, price)
-
             return {
                 "timestamp": datetime.datetime.now().isoformat(),
                 "variant": variant,
@@ -463,7 +754,171 @@ async def scrape_site(page, item):
         print(f"Error scraping {url}: {e}")
         return None
 
-async def main():
+async def scrape_items(items, record_dir=None, replay_dir=None, state_dir=STATE_DIR, strategy_file=STRATEGY_FILE):
+    """
+    Scrapes all items concurrently and returns the new records.
+    - record_dir: save each item's network traffic to a HAR archive there.
+    - replay_dir: serve each item's pages from its HAR archive, without network.
+    - state_dir: in normal runs, each site shares a context restored from and
+      saved back to its storage state there, so region/language choices persist.
+      Blockers are only not waited for once that state is known-good.
+    - strategy_file: per-site extraction strategies learned across runs
+      (not used when replaying, so replays always try strategies in the same order).
+    """
+    # Copies, so per-run flags never leak into the config
+    items = [{**item, 'replay': True} if replay_dir else dict(item) for item in items]
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+
+    strategies = StrategyCache() if replay_dir else StrategyCache.load(strategy_file)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+
+        site_contexts = {}
+        state_loaded = {}
+        state_known_good = {}
+        if not record_dir and not replay_dir:
+            for item in items:
+                site_name = item.get('site_name')
+                if site_name not in site_contexts:
+                    state_path = storage_state_path(site_name, state_dir)
+                    loaded = os.path.exists(state_path)
+                    try:
+                        site_contexts[site_name] = await browser.new_context(
+                            user_agent=USER_AGENT,
+                            storage_state=state_path if loaded else None
+                        )
+                    except Exception as e:
+                        print(f"Ignoring unreadable storage state for {site_name}: {e}")
+                        loaded = False
+                        site_contexts[site_name] = await browser.new_context(user_agent=USER_AGENT)
+                    known_good = loaded and os.path.exists(known_good_path(site_name, state_dir))
+                    if loaded:
+                        print(f"Loaded {'known-good ' if known_good else ''}storage state for {site_name}")
+                    state_loaded[site_name] = loaded
+                    state_known_good[site_name] = known_good
+                item['storage_state_known_good'] = state_known_good[site_name]
+
+        # Concurrency control
+        sem = asyncio.Semaphore(5)
+        # Items on the same product page share its load. Not when recording,
+        # so every HAR archive holds the full traffic of its own item.
+        product_pages = None if record_dir else {}
+
+        async def new_item_context(item):
+            # Record/replay need one context per item so each gets its own archive
+            if record_dir:
+                return await browser.new_context(
+                    user_agent=USER_AGENT,
+                    record_har_path=har_path(record_dir, item),
+                    record_har_content='embed'
+                )
+            if replay_dir:
+                item_context = await browser.new_context(user_agent=USER_AGENT)
+                await item_context.route_from_har(har_path(replay_dir, item), not_found='abort')
+                return item_context
+            return site_contexts[item.get('site_name')]
+
+        async def scrape_worker(item):
+            async with sem:
+                try:
+                    item_context = await new_item_context(item)
+                except Exception as e:
+                    print(f"Error preparing browser context for {item.get('site_name')}: {e}")
+                    return None
+                page = None
+                try:
+                    page = await item_context.new_page()
+                    return await scrape_site(page, item, strategies, product_pages)
+                except Exception as e:
+                    print(f"Error opening page for {item.get('site_name')}: {e}")
+                    return None
+                finally:
+                    if page is not None:
+                        await page.close()
+                    if record_dir or replay_dir:
+                        # Closing the context flushes the HAR archive
+                        await item_context.close()
+
+        tasks = [scrape_worker(item) for item in items]
+        results = await asyncio.gather(*tasks)
+
+        # Persist the state reached this run: blockers were answered through their
+        # own controls, so it carries the region/language choice. A state becomes
+        # known-good once a run that loaded it got a page past the blocker check
+        # without meeting the geo modal; if it came back, the fresh state saved
+        # here has to prove itself again next run. Runs where no page got that
+        # far (timeouts, network errors) prove nothing either way.
+        for site_name, site_context in site_contexts.items():
+            state_path = storage_state_path(site_name, state_dir)
+            marker_path = known_good_path(site_name, state_dir)
+            site_items = [item for item in items if item.get('site_name') == site_name]
+            blocker_seen = any(item.get('blocker_seen') for item in site_items)
+            checked = any(item.get('blocker_checked') for item in site_items)
+            try:
+                os.makedirs(state_dir, exist_ok=True)
+                await site_context.storage_state(path=state_path)
+                if blocker_seen:
+                    if os.path.exists(marker_path):
+                        os.remove(marker_path)
+                    if state_loaded[site_name]:
+                        print(f"Blocker reappeared for {site_name} despite stored state. Saved a new one.")
+                elif checked and state_loaded[site_name] and not state_known_good[site_name]:
+                    with open(marker_path, 'w') as f:
+                        f.write(datetime.datetime.now().isoformat())
+            except Exception as e:
+                print(f"Error updating storage state for {site_name}: {e}")
+
+        await browser.close()
+
+    if not replay_dir:
+        for site_name in sorted(strategies.changed):
+            print(f"Layout changed on {site_name}: extraction strategies updated.")
+        try:
+            strategies.save(strategy_file)
+        except OSError as e:
+            print(f"Error saving extraction strategies: {e}")
+
+    # Filter None results
+    return [r for r in results if r]
+
+async def check_alerts(items, new_data, stats):
+    """
+    Updates the stats index with the new PriceRecords and sends alerts for prices
+    at or below target, or below the series' previous all-time low.
+    """
+    items_by_series = {
+        (item.get('site_name'), item.get('target_ram', item.get('variant'))): item
+        for item in items
+    }
+
+    for record in new_data:
+        new_low = stats.update(record)
+        price = record.price
+        item = items_by_series.get((record.site, record.variant))
+        if not price or item is None:
+            continue
+
+        target_price = item.get('target_price')
+        if target_price and price <= target_price:
+            print(f"Price {price} is below target {target_price}! Sending alert...")
+        elif new_low:
+            print(f"Price {price} is a new all-time low for {record.variant} - {record.site}! Sending alert...")
+        else:
+            continue
+        await send_telegram_alert(item, price, stats.get(record.site, record.variant))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrapes configured prices.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', metavar='DIR', help="Save each item's network traffic to HAR archives in DIR.")
+    mode.add_argument('--replay', metavar='DIR', help="Serve pages from the HAR archives in DIR, without network. Nothing is saved.")
+    return parser.parse_args(argv)
+
+async def main(argv=None):
+    args = parse_args(argv)
+
     if not os.path.exists(CONFIG_FILE):
         print(f"Config file {CONFIG_FILE} not found.")
         return
@@ -477,52 +932,43 @@ async def main():
         print("No active items to scrape.")
         return
 
+    if args.replay:
+        new_data = await scrape_items(active_items, replay_dir=args.replay)
+        for record in new_data:
+            print(f"Replayed {record['site']} ({record['variant']}): {record['price']}")
+        print(f"Replay finished: {len(new_data)}/{len(active_items)} items extracted. History not modified.")
+        return
+
     if os.path.exists(DATA_FILE):
         with open(DATA_FILE, 'r') as f:
             try:
-                history = json.load(f)
+                history = read_records(f)
             except json.JSONDecodeError:
                 history = []
     else:
         history = []
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
+    stats = load_stats(history)
 
-        # Concurrency control
-        sem = asyncio.Semaphore(5)
-
-        async def scrape_worker(item):
-            async with sem:
-                page = await context.new_page()
-                try:
-                    return await scrape_site(page, item)
-                finally:
-                    await page.close()
-
-        tasks = [scrape_worker(item) for item in active_items]
-        results = await asyncio.gather(*tasks)
-
-        # Filter None results
-        new_data = [r for r in results if r]
-
-        await browser.close()
+    new_data = load_records(await scrape_items(active_items, record_dir=args.record))
 
     if new_data:
+        await check_alerts(active_items, new_data, stats)
+
         history.extend(new_data)
 
         # Cleanup old data
         history = clean_price_history(history)
 
         # Sort is ensured by clean_price_history but explicit sort is fine too
-        # history.sort(key=lambda x: x['timestamp'])
+        # history.sort(key=record_sort_key)
 
         with open(DATA_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+            json.dump(dump_records(history), f, indent=2)
+        save_stats(stats)
         print(f"Saved {len(new_data)} new price records. History size: {len(history)}")
+        for line in stats.summary_lines():
+            print(line)
     else:
         print("No new data found.")
 
@@ -0,0 +1,293 @@
+import argparse
+import bisect
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from records import read_records, to_epoch_us
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_FILE = os.path.join(ROOT_DIR, 'data', 'prices.json')
+INDEX_FILE = os.path.join(ROOT_DIR, 'index.html')
+# Served from the same directory as the history file
+STATS_FILE_NAME = 'stats.json'
+
+DEFAULT_MAX_POINTS = 500
+MAX_SERIES_POINTS = 5000
+MAX_RECORDS_PAGE = 200
+MAX_CACHED_RESPONSES = 256
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 512
+
+
+def downsample(points, max_points):
+    """
+    Reduces a chronological list of (epoch_us, timestamp, price) points to at most
+    max_points (at least 2), keeping the lowest and highest price of every
+    bucket so that drops and spikes survive the reduction.
+    """
+    # Each bucket contributes its min and max: fewer than 2 points cannot keep both
+    max_points = max(max_points, 2)
+    if len(points) <= max_points:
+        return list(points)
+
+    buckets = max_points // 2
+    size = len(points) / buckets
+    result = []
+    for b in range(buckets):
+        chunk = points[int(b * size):int((b + 1) * size)]
+        if not chunk:
+            continue
+        lo = min(chunk, key=lambda p: p[2])
+        hi = max(chunk, key=lambda p: p[2])
+        if lo is hi:
+            result.append(lo)
+        elif lo[0] <= hi[0]:
+            result.extend((lo, hi))
+        else:
+            result.extend((hi, lo))
+    return result
+
+
+class HistorySnapshot:
+    """
+    One loaded version of the history: its ETag, the per-series points and
+    the responses rendered from it. Never mutated after a reload, so a request
+    that holds a snapshot always answers with a matching ETag and body.
+    """
+
+    def __init__(self, etag, series, records):
+        self.etag = etag
+        self.series = series
+        self.records = records
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def query_series(self, site=None, variant=None, start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+        """
+        Returns the series matching site/variant (all if omitted), restricted
+        to [start, end] and downsampled to max_points per series.
+        """
+        start_epoch = to_epoch_us(start) if start else None
+        end_epoch = to_epoch_us(end) if end else None
+
+        result = []
+        for (s, v), points in sorted(self.series.items()):
+            if site and s != site:
+                continue
+            if variant and v != variant:
+                continue
+
+            lo = 0
+            hi = len(points)
+            if start_epoch is not None:
+                lo = bisect.bisect_left(points, start_epoch, key=lambda p: p[0])
+            if end_epoch is not None:
+                hi = bisect.bisect_right(points, end_epoch, key=lambda p: p[0])
+            selected = points[lo:hi]
+
+            result.append({
+                "site": s,
+                "variant": v,
+                "count": len(selected),
+                "points": [{"x": ts, "y": price} for _, ts, price in downsample(selected, max_points)]
+            })
+        return {"series": result}
+
+    def query_records(self, offset=0, limit=20):
+        """
+        Returns a page of raw records, newest first.
+        """
+        return {
+            "total": len(self.records),
+            "records": [record.to_dict() for record in self.records[offset:offset + limit]]
+        }
+
+    def cached_response(self, key, build):
+        """
+        Returns (body, gzipped_body) for key, building and compressing it at
+        most once per snapshot. gzipped_body is None for small bodies.
+        """
+        with self._lock:
+            cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+
+        body = json.dumps(build(self), separators=(',', ':')).encode('utf-8')
+        gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_SIZE else None
+        cached = (body, gzipped)
+        with self._lock:
+            if len(self._responses) >= MAX_CACHED_RESPONSES:
+                self._responses.clear()
+            self._responses[key] = cached
+        return cached
+
+
+class PriceIndex:
+    """
+    In-memory view of data/prices.json, reloaded only when the file changes.
+    Series are kept sorted by time so range queries are a bisect away, and
+    rendered responses are cached until the next write.
+    """
+
+    def __init__(self, data_file=DATA_FILE):
+        self.data_file = data_file
+        self._snapshot = HistorySnapshot(None, {}, [])
+        self._lock = threading.Lock()
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.data_file)
+        except OSError:
+            return '"empty"'
+        return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+    def _load(self, version):
+        try:
+            with open(self.data_file, 'r') as f:
+                history = read_records(f)
+        except (OSError, json.JSONDecodeError):
+            history = []
+
+        history.sort(key=lambda r: r.ts if r.ts is not None else -1 << 62, reverse=True)
+
+        series = {}
+        for record in reversed(history):
+            if record.ts is None or record.price is None:
+                continue
+            key = (record.site or 'Unknown', record.variant or 'Unknown')
+            series.setdefault(key, []).append((record.ts, record.timestamp, record.price))
+
+        return HistorySnapshot(version, series, history)
+
+    def snapshot(self):
+        """
+        Returns the current HistorySnapshot, reloading the history first if
+        the data file changed since the last load.
+        """
+        version = self._file_version()
+        with self._lock:
+            if version != self._snapshot.etag:
+                self._snapshot = self._load(version)
+            return self._snapshot
+
+    def refresh(self):
+        """
+        Reloads the history if needed. Returns the current ETag.
+        """
+        return self.snapshot().etag
+
+
+class PriceRequestHandler(BaseHTTPRequestHandler):
+    index = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+        if parsed.path in ('/', '/index.html'):
+            self._send_file(INDEX_FILE, 'text/html; charset=utf-8')
+        elif parsed.path == '/data/stats.json':
+            self._send_file(os.path.join(os.path.dirname(self.index.data_file), STATS_FILE_NAME), 'application/json')
+        elif parsed.path == '/api/series':
+            self._send_api(parsed.path, params, self._build_series)
+        elif parsed.path == '/api/records':
+            self._send_api(parsed.path, params, self._build_records)
+        else:
+            self.send_error(404)
+
+    def _build_series(self, params):
+        try:
+            max_points = min(max(int(params.get('max_points', DEFAULT_MAX_POINTS)), 2), MAX_SERIES_POINTS)
+        except ValueError:
+            max_points = DEFAULT_MAX_POINTS
+        return lambda snapshot: snapshot.query_series(
+            site=params.get('site'),
+            variant=params.get('variant'),
+            start=params.get('start'),
+            end=params.get('end'),
+            max_points=max_points
+        )
+
+    def _build_records(self, params):
+        try:
+            offset = max(int(params.get('offset', 0)), 0)
+            limit = min(max(int(params.get('limit', 20)), 0), MAX_RECORDS_PAGE)
+        except ValueError:
+            offset, limit = 0, 20
+        return lambda snapshot: snapshot.query_records(offset=offset, limit=limit)
+
+    def _send_api(self, path, params, build):
+        # ETag and body both come from the same snapshot, even if a reload happens meanwhile
+        snapshot = self.index.snapshot()
+        if self.headers.get('If-None-Match') == snapshot.etag:
+            self.send_response(304)
+            self.send_header('ETag', snapshot.etag)
+            self.end_headers()
+            return
+
+        key = (path, tuple(sorted(params.items())))
+        body, gzipped = snapshot.cached_response(key, build(params))
+        self._send_body(body, 'application/json', snapshot.etag, gzipped=gzipped)
+
+    def _send_file(self, path, content_type):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        self._send_body(body, content_type)
+
+    def _send_body(self, body, content_type, etag=None, gzipped=None):
+        encoding = None
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            if gzipped is None and len(body) >= GZIP_MIN_SIZE:
+                gzipped = gzip.compress(body, compresslevel=6)
+            if gzipped is not None:
+                body = gzipped
+                encoding = 'gzip'
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host='127.0.0.1', port=8000, data_file=DATA_FILE):
+    """
+    Builds the HTTP server bound to host:port serving the given history file.
+    """
+    handler = type('BoundPriceRequestHandler', (PriceRequestHandler,), {'index': PriceIndex(data_file)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local server for the price chart.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--data', default=DATA_FILE)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.data)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import datetime
+import json
+import os
+from collections import deque
+
+from records import US_PER_DAY, from_epoch_us, to_epoch_us
+
+STATS_FILE = 'data/stats.json'
+STATS_VERSION = 2
+
+# Rolling windows (days) for which the minimum price is tracked
+WINDOWS = (7, 30, 90)
+
+
+def _point(entry):
+    # (ts, price) -> the {"timestamp", "price"} shape written to stats.json
+    if entry is None:
+        return None
+    ts, price = entry
+    return {"timestamp": from_epoch_us(ts), "price": price}
+
+
+def _from_point(data):
+    if not data:
+        return None
+    ts = to_epoch_us(data.get('timestamp'))
+    return None if ts is None else (ts, data.get('price'))
+
+
+class SeriesStats:
+    """
+    Running statistics for one (site, variant) series, updated in O(1)
+    amortized per record. Times are epoch microseconds, as in PriceRecord.
+    Rolling minimums use monotonic deques of (ts, price): prices increase
+    from front to back, so the front is always the window minimum.
+    """
+
+    def __init__(self, site, variant):
+        self.site = site
+        self.variant = variant
+        self.count = 0
+        self.changes = 0
+        self.drops = 0
+        self.rises = 0
+        self._last = None
+        self._all_time_min = None
+        self.windows = {days: deque() for days in WINDOWS}
+
+    @property
+    def last(self):
+        return _point(self._last)
+
+    @property
+    def all_time_min(self):
+        return _point(self._all_time_min)
+
+    def _evict(self, now_ts):
+        for days, window in self.windows.items():
+            cutoff = now_ts - days * US_PER_DAY
+            while window and window[0][0] < cutoff:
+                window.popleft()
+
+    def add(self, ts, price):
+        """
+        Adds a record at epoch microseconds `ts` (records are expected in
+        chronological order). Returns True if it sets a new all-time low
+        (below a previous minimum).
+        """
+        if ts is None or price is None:
+            return False
+
+        self.count += 1
+        if self._last is not None and price != self._last[1]:
+            self.changes += 1
+            if price < self._last[1]:
+                self.drops += 1
+            else:
+                self.rises += 1
+        self._last = (ts, price)
+
+        new_low = self._all_time_min is not None and price < self._all_time_min[1]
+        if self._all_time_min is None or price < self._all_time_min[1]:
+            self._all_time_min = (ts, price)
+
+        for window in self.windows.values():
+            while window and window[-1][1] >= price:
+                window.pop()
+            window.append((ts, price))
+        self._evict(ts)
+
+        return new_low
+
+    def update(self, timestamp, price):
+        """
+        Same as add() for an ISO timestamp.
+        """
+        return self.add(to_epoch_us(timestamp), price)
+
+    def rolling_min(self, days, now_ts=None):
+        """
+        Returns {"timestamp", "price"} of the minimum over the last `days` days, or None.
+        """
+        window = self.windows[days]
+        if now_ts is not None:
+            cutoff = now_ts - days * US_PER_DAY
+            while window and window[0][0] < cutoff:
+                window.popleft()
+        return _point(window[0]) if window else None
+
+    def to_dict(self, now_ts=None):
+        return {
+            "site": self.site,
+            "variant": self.variant,
+            "count": self.count,
+            "changes": self.changes,
+            "drops": self.drops,
+            "rises": self.rises,
+            "last": self.last,
+            "all_time_min": self.all_time_min,
+            "rolling_min": {str(days): self.rolling_min(days, now_ts) for days in WINDOWS},
+            "windows": {str(days): [list(entry) for entry in window] for days, window in self.windows.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data.get('site', 'Unknown'), data.get('variant', 'Unknown'))
+        stats.count = data.get('count', 0)
+        stats.changes = data.get('changes', 0)
+        stats.drops = data.get('drops', 0)
+        stats.rises = data.get('rises', 0)
+        stats._last = _from_point(data.get('last'))
+        stats._all_time_min = _from_point(data.get('all_time_min'))
+        windows = data.get('windows', {})
+        for days in WINDOWS:
+            stats.windows[days] = deque(tuple(entry) for entry in windows.get(str(days), []))
+        return stats
+
+
+class PriceStatsIndex:
+    """
+    Per-series statistics keyed by (site, variant), persisted to data/stats.json
+    so that alerts, the summary and the frontend never rescan the history.
+    """
+
+    def __init__(self):
+        self.series = {}
+
+    def get(self, site, variant):
+        return self.series.get((site, variant))
+
+    def update(self, record):
+        """
+        Ingests one PriceRecord. Returns True if it is a new all-time low for its series.
+        """
+        if record.ts is None:
+            return False
+        site = record.site or 'Unknown'
+        variant = record.variant or 'Unknown'
+        stats = self.series.get((site, variant))
+        if stats is None:
+            stats = self.series[(site, variant)] = SeriesStats(site, variant)
+        return stats.add(record.ts, record.price)
+
+    @classmethod
+    def build(cls, history):
+        """
+        Rebuilds the index from a full history of PriceRecords (used when no stats file exists).
+        """
+        index = cls()
+        for record in sorted((r for r in history if r.ts is not None), key=lambda r: r.ts):
+            index.update(record)
+        return index
+
+    def to_dict(self, reference_date=None):
+        if reference_date is None:
+            reference_date = datetime.datetime.now()
+        now_ts = to_epoch_us(reference_date.isoformat())
+        return {
+            "version": STATS_VERSION,
+            "updated": reference_date.isoformat(),
+            "series": [stats.to_dict(now_ts) for _, stats in sorted(self.series.items())]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        for entry in data.get('series', []):
+            stats = SeriesStats.from_dict(entry)
+            index.series[(stats.site, stats.variant)] = stats
+        return index
+
+    def summary_lines(self, reference_date=None):
+        """
+        Returns one human readable line per series.
+        """
+        if reference_date is None:
+            reference_date = datetime.datetime.now()
+        now_ts = to_epoch_us(reference_date.isoformat())
+
+        def fmt(entry):
+            return f"{entry['price']}" if entry else "-"
+
+        lines = []
+        for (site, variant), stats in sorted(self.series.items()):
+            rolling = " | ".join(f"{days}d {fmt(stats.rolling_min(days, now_ts))}" for days in WINDOWS)
+            lines.append(
+                f"{variant} - {site}: last {fmt(stats.last)} | {rolling} | "
+                f"all-time {fmt(stats.all_time_min)} | changes {stats.changes} "
+                f"({stats.drops} down, {stats.rises} up)"
+            )
+        return lines
+
+
+def load_stats(history, stats_file=STATS_FILE):
+    """
+    Loads the persisted index, rebuilding it from history if missing or unreadable.
+    """
+    if os.path.exists(stats_file):
+        try:
+            with open(stats_file, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == STATS_VERSION:
+                return PriceStatsIndex.from_dict(data)
+        except (OSError, ValueError, AttributeError):
+            pass
+    print("Stats index missing or outdated. Rebuilding from history...")
+    return PriceStatsIndex.build(history)
+
+
+def save_stats(index, stats_file=STATS_FILE):
+    with open(stats_file, 'w') as f:
+        json.dump(index.to_dict(), f, indent=2)
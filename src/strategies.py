@@ -0,0 +1,104 @@
+import datetime
+import json
+import os
+import time
+
+STRATEGY_FILE = '.cache/strategies.json'
+
+# A strategy that failed this many times in a row is only tried as a last resort
+STALE_AFTER = 3
+
+
+class StrategyCache:
+    """
+    Per-site record of which extraction strategy last succeeded for each
+    stage (e.g. "variant:96GB", "price:96GB") and how long it took. Cheap
+    side-effect free probes are tried first, then the last winner, stale
+    strategies last. Winning with another strategy than the one loaded is a
+    layout change.
+    """
+
+    def __init__(self, sites=None):
+        self.sites = sites or {}
+        self.changed = set()
+        # Winners as loaded, so every item of a run is compared to the same baseline
+        self.initial = {
+            site: {stage: entry.get('winner') for stage, entry in stages.items()}
+            for site, stages in self.sites.items()
+        }
+
+    @classmethod
+    def load(cls, path=STRATEGY_FILE):
+        try:
+            with open(path, 'r') as f:
+                return cls(json.load(f))
+        except (OSError, ValueError):
+            return cls()
+
+    def save(self, path=STRATEGY_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.sites, f, indent=2, sort_keys=True)
+
+    def _entry(self, site, stage):
+        return self.sites.setdefault(site, {}).setdefault(stage, {"winner": None, "failures": {}})
+
+    def order(self, site, stage, names, probe=()):
+        """
+        Returns names reordered: the `probe` strategies first, then the last
+        winner, then the default order, with stale strategies moved to the end.
+        """
+        entry = self._entry(site, stage)
+        failures = entry.get('failures', {})
+        winner = entry.get('winner')
+        ordered = sorted(names, key=lambda name: (
+            failures.get(name, 0) >= STALE_AFTER,
+            name not in probe,
+            name != winner
+        ))
+        return ordered
+
+    async def run(self, site, stage, steps, probe=()):
+        """
+        Tries the strategies in `steps` ({name: async callable}) in learned
+        order until one returns a truthy result. Strategies named in `probe`
+        are cheap and side-effect free, so they are tried before the last
+        winner. Returns (name, result), or (None, None) if all failed.
+        """
+        entry = self._entry(site, stage)
+        previous = entry.get('winner')
+
+        for name in self.order(site, stage, list(steps), probe):
+            start = time.perf_counter()
+            try:
+                result = await steps[name]()
+            except Exception as e:
+                print(f"Strategy {stage}/{name} raised: {e}")
+                result = None
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
+
+            if result:
+                if previous and previous != name:
+                    print(f"Layout change on {site}: {stage} strategy '{previous}' no longer works, '{name}' does.")
+                    self.changed.add(site)
+                entry['winner'] = name
+                entry['ms'] = elapsed_ms
+                entry['updated'] = datetime.datetime.now().isoformat()
+                entry['failures'][name] = 0
+                return name, result
+
+            entry['failures'][name] = entry['failures'].get(name, 0) + 1
+            print(f"Strategy {stage}/{name} failed on {site} ({elapsed_ms} ms)")
+
+        return None, None
+
+    def layout_changed(self, site, winners):
+        """
+        Returns True if any stage in `winners` ({stage: name}, as returned by
+        run()) was won by another strategy than the one loaded at the start.
+        """
+        initial = self.initial.get(site, {})
+        return any(
+            initial.get(stage) is not None and name != initial.get(stage)
+            for stage, name in winners.items()
+        )
@@ -0,0 +1,273 @@
+import argparse
+import datetime
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+# Mock requests before importing scraper
+sys.modules['requests'] = MagicMock()
+sys.modules['playwright'] = MagicMock()
+sys.modules['playwright.async_api'] = MagicMock()
+
+# Add src to python path to import scraper
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from scraper import COUPON_PATTERN, clean_price_history, parse_price
+from records import dump_records, load_records, read_records
+from stats import PriceStatsIndex
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'benchmark_baselines')
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_THRESHOLD = 0.25
+# Each timing sample loops over a case for at least this long (seconds)
+DEFAULT_MIN_TIME = 0.2
+REFERENCE_DATE = datetime.datetime(2024, 6, 1, 12, 0, 0)
+
+SITES = ["GMKtec Official", "PcComponentes", "Amazon", "MediaMarkt", "Coolmod"]
+VARIANTS = ["64GB", "96GB", "128GB", "96GB+2TB", "128GB+2TB"]
+URL = "https://de.gmktec.com/es/products/gmktec-evo-x2-amd-ryzen%E2%84%A2-ai-max-395-mini-pc-1"
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def generate_history(n, series=len(SITES) * len(VARIANTS), seed=42):
+    """
+    Generates n records spread over `series` (site, variant) pairs, one record
+    per series every 6 hours up to REFERENCE_DATE, prices following a random walk.
+    """
+    rng = random.Random(seed)
+    keys = [(site, variant) for site in SITES for variant in VARIANTS][:series]
+    prices = {key: rng.uniform(1500, 2500) for key in keys}
+    steps = n // len(keys) + 1
+    start = REFERENCE_DATE - datetime.timedelta(hours=6 * steps)
+
+    history = []
+    for i in range(n):
+        key = keys[i % len(keys)]
+        step = i // len(keys)
+        ts = start + datetime.timedelta(hours=6 * step, seconds=rng.randint(0, 59), microseconds=rng.randint(0, 999999))
+        if rng.random() < 0.05:
+            prices[key] = max(500.0, prices[key] + rng.choice([-50, -20, 20, 50]))
+        history.append({
+            "timestamp": ts.isoformat(),
+            "variant": key[1],
+            "site": key[0],
+            "price": round(prices[key], 2),
+            "url": URL,
+            "metadata": {
+                "base_price": round(prices[key] + 50, 2),
+                "discount_applied": 50.0,
+                "coupons_found": ["GMKEVO50OFF", "GMKtec", "GMKTEC"]
+            }
+        })
+    return history
+
+def generate_body_text(size, seed=42):
+    """
+    Generates roughly `size` characters of product page text with prices,
+    navigation noise and a few coupon codes, like the text read from 'body'.
+    """
+    rng = random.Random(seed)
+    words = [
+        "Mini", "PC", "AMD", "Ryzen", "AI", "Max", "395", "LPDDR5X", "8000MHz", "SSD", "PCIe", "4.0",
+        "Envío", "gratis", "Añadir", "al", "carrito", "Subtotal:", "Comprar", "ahora", "garantía",
+        "Top", "deals", "under", "€159", "Save", "€20", "when", "you", "buy", "2", "GMKtec", "EVO-X2",
+    ]
+    coupons = ["GMKEVO50OFF", "GMK20OFF", "GMKtec", "GMKTEC"]
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.01:
+            token = rng.choice(coupons)
+        elif roll < 0.05:
+            token = f"{rng.randint(100, 2999)},{rng.randint(0, 99):02d} €"
+        else:
+            token = rng.choice(words)
+        parts.append(token)
+        length += len(token) + 1
+    return " ".join(parts)
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure(fn, repeat=3, min_time=DEFAULT_MIN_TIME):
+    """
+    Times fn like timeit's autorange: each of `repeat` samples calls it in a
+    loop lasting at least min_time seconds, and the best per-call average is
+    kept, so millisecond cases are not decided by a single hiccup.
+    Returns (seconds per call, peak traced bytes of one run).
+    Timing runs are untraced; one extra run under tracemalloc gives the peak.
+    """
+    number = 1
+    while True:
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+
+    for _ in range(repeat - 1):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def iter_cases(size):
+    """
+    Yields (case name, callable) for one history size. Each input is built
+    right before the cases that use it and dropped right after, so only the
+    hot path itself is measured and a run never holds every representation
+    of a large history at once.
+    """
+    body = generate_body_text(size * 20)
+    yield f"coupon_scan[{size * 20}]", lambda: set(COUPON_PATTERN.findall(body))
+    del body
+
+    price_strings = [
+        f"{r['price']:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.')
+        for r in generate_history(min(size, 10_000))
+    ]
+    yield f"parse_price[{len(price_strings)}]", lambda: [parse_price(s) for s in price_strings]
+    del price_strings
+
+    history = generate_history(size)
+    yield f"json_dump[{size}]", lambda: json.dumps(history, indent=2)
+    yield f"records_load[{size}]", lambda: load_records(history)
+
+    records = load_records(history)
+    yield f"records_dump[{size}]", lambda: dump_records(records)
+    yield f"clean_price_history[{size}]", lambda: clean_price_history(records, reference_date=REFERENCE_DATE)
+    yield f"stats_build[{size}]", lambda: PriceStatsIndex.build(records)
+    del records
+
+    # Read back from a file like main() does, so the text is decoded once
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(history, f, indent=2)
+        path = f.name
+    del history
+
+    def read_json(parse):
+        with open(path, 'r') as f:
+            return parse(f)
+
+    try:
+        yield f"json_load[{size}]", lambda: read_json(json.load)
+        yield f"records_read[{size}]", lambda: read_json(read_records)
+        yield f"history_pipeline[{size}]", lambda: json.dumps(dump_records(clean_price_history(
+            read_json(read_records), reference_date=REFERENCE_DATE)), indent=2)
+    finally:
+        os.unlink(path)
+
+def run(sizes, repeat, min_time=DEFAULT_MIN_TIME):
+    results = {}
+    for size in sizes:
+        for name, fn in iter_cases(size):
+            if name in results:
+                continue
+            seconds, peak = measure(fn, repeat, min_time)
+            results[name] = {"seconds": seconds, "peak_bytes": peak}
+            print(f"{name:<34} {seconds * 1000:>10.2f} ms {peak / 1024 / 1024:>10.2f} MiB")
+    return results
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+
+def machine_tag():
+    """
+    Identifies the machine and interpreter so baselines are only compared on like hardware.
+    """
+    node = hashlib.sha1(platform.node().encode('utf-8')).hexdigest()[:8]
+    return f"{platform.system()}-{platform.machine()}-py{platform.python_version()}-{node}".lower()
+
+def baseline_path(tag):
+    return os.path.join(BASELINE_DIR, f"{tag}.json")
+
+def compare(results, baseline, threshold):
+    """
+    Returns a list of regression messages for cases slower or heavier than
+    the baseline by more than `threshold` (fraction).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                change = current[metric] / previous[metric] - 1
+                regressions.append(f"{name} {metric}: {previous[metric]:.6g} -> {current[metric]:.6g} (+{change:.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the history and parsing hot paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="History sizes to generate (e.g. 10000 100000 1000000; about 6 GB of RAM per million records).")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME,
+                        help="Minimum duration (s) of each timing sample; fast cases are looped until reached.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown/memory growth over the baseline, as a fraction.")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store these results as the baseline for this machine.")
+    args = parser.parse_args(argv)
+
+    tag = machine_tag()
+    print(f"Machine: {tag}")
+    results = run(args.sizes, args.repeat, args.min_time)
+
+    path = baseline_path(tag)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {path}")
+        return 0
+
+    if not os.path.exists(path):
+        print("No baseline for this machine. Create one with --save-baseline.")
+        return 0
+
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions over {args.threshold:.0%} threshold:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print(f"\nNo regressions over {args.threshold:.0%} threshold.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Add src to python path to import scraper
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from scraper import CONFIG_FILE, har_path, scrape_items
+
+# Archives recorded with: python src/scraper.py --record tests/har
+HAR_DIR = os.path.join(os.path.dirname(__file__), 'har')
+ROUNDS = 3
+
+async def benchmark(har_dir=HAR_DIR, rounds=ROUNDS):
+    with open(CONFIG_FILE, 'r') as f:
+        config = json.load(f)
+
+    items = [item for item in config if item.get('active', True)]
+    items = [item for item in items if os.path.exists(har_path(har_dir, item))]
+    if not items:
+        print(f"No HAR archives found in {har_dir}. Record them first with --record.")
+        return
+
+    print(f"Benchmark: replaying {len(items)} items x {rounds} rounds from {har_dir}")
+
+    durations = []
+    for _ in range(rounds):
+        start_time = time.time()
+        results = await scrape_items(items, replay_dir=har_dir)
+        durations.append(time.time() - start_time)
+        print(f"Round: {len(results)}/{len(items)} extracted in {durations[-1]:.2f}s")
+
+    best = min(durations)
+    print("")
+    print(f"Best round: {best:.2f}s")
+    print(f"Throughput: {len(items) / best:.2f} items/s")
+
+if __name__ == "__main__":
+    asyncio.run(benchmark(*sys.argv[1:2]))
@@ -14,6 +14,7 @@ sys.modules['playwright.async_api'] = MagicMock()
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
 
 from scraper import clean_price_history
+from records import load_records
 
 class TestCleanup(unittest.TestCase):
     def setUp(self):
@@ -26,7 +27,7 @@ class TestCleanup(unittest.TestCase):
             dt = dt.replace(hour=hour, minute=0, second=0, microsecond=0)
             return dt.isoformat()
 
-        self.data = [
+        self.data = load_records([
             # --- RECENT DATA (< 14 days) ---
             # Day 0 (Today)
             {"timestamp": days_ago(0), "variant": "96GB", "price": 1000, "site": "SiteA"},
@@ -51,7 +52,7 @@ class TestCleanup(unittest.TestCase):
             # Week of 5 weeks ago (Days 35+)
             {"timestamp": days_ago(35), "variant": "96GB", "price": 1500, "site": "SiteA"},
             {"timestamp": days_ago(36), "variant": "96GB", "price": 1550, "site": "SiteA"},
-        ]
+        ])
 
     def test_clean_price_history(self):
         # We expect:
@@ -70,19 +71,19 @@ class TestCleanup(unittest.TestCase):
 
         # Verify specific retained records
         prices_96gb_old_week1 = [
-            x['price'] for x in cleaned
-            if x['variant'] == "96GB" and x['price'] == 900
+            x.price for x in cleaned
+            if x.variant == "96GB" and x.price == 900
         ]
         self.assertEqual(len(prices_96gb_old_week1), 1, "Should keep lowest price 900 for 96GB in old week 1")
 
         prices_96gb_old_week1_high = [
-            x['price'] for x in cleaned
-            if x['variant'] == "96GB" and x['price'] == 1200
+            x.price for x in cleaned
+            if x.variant == "96GB" and x.price == 1200
         ]
         self.assertEqual(len(prices_96gb_old_week1_high), 0, "Should remove higher price 1200 for 96GB in old week 1")
 
         # Verify recent data is untouched
-        recent_count = len([x for x in cleaned if x['price'] in [1000, 1005, 1010]])
+        recent_count = len([x for x in cleaned if x.price in [1000, 1005, 1010]])
         self.assertEqual(recent_count, 3)
 
 if __name__ == '__main__':
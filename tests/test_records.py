@@ -0,0 +1,78 @@
+import unittest
+import datetime
+import sys
+import os
+import io
+import json
+
+# Add src to python path to import records
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from records import PriceRecord, dump_records, iso_week, load_records, read_records, to_epoch_us
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'prices.json')
+
+class TestPriceRecord(unittest.TestCase):
+    def test_round_trip_keeps_json_shape(self):
+        with open(DATA_FILE, 'r') as f:
+            history = json.load(f)
+        self.assertEqual(dump_records(load_records(history)), history)
+
+    def test_read_records_matches_load_records(self):
+        with open(DATA_FILE, 'r') as f:
+            history = json.load(f)
+        # Nested metadata with a price (e.g. the strategy used) stays a dict
+        history.append({"timestamp": "2024-01-01T10:00:00", "variant": "96GB", "site": "SiteA", "price": 1,
+                        "metadata": {"strategy": {"variant": "label", "price": "subtotal"}}})
+        history.append({"timestamp": "2024-01-01T10:00:00", "price": 2})
+        records = read_records(io.StringIO(json.dumps(history)))
+        self.assertEqual(records, load_records(history))
+        self.assertEqual(dump_records(records), history)
+
+    def test_only_other_keys_kept_as_extra(self):
+        data = {"timestamp": "2024-01-01T10:00:00", "variant": "96GB", "site": "SiteA", "price": 1,
+                "metadata": {"base_price": 1}}
+        record = PriceRecord.from_dict(data)
+        self.assertEqual(record.extra, {"metadata": {"base_price": 1}})
+        self.assertIs(record.extra["metadata"], data["metadata"])
+
+    def test_timestamp_parsed_once_to_epoch(self):
+        record = PriceRecord.from_dict({"timestamp": "2024-01-01T10:00:00.500000", "variant": "96GB", "site": "SiteA", "price": 1000})
+        self.assertEqual(record.ts, to_epoch_us("2024-01-01T10:00:00.500000"))
+        self.assertEqual(record.ts % 1_000_000, 500_000)
+        self.assertEqual(record.timestamp, "2024-01-01T10:00:00.500000")
+
+    def test_invalid_timestamp_kept_verbatim(self):
+        data = {"timestamp": "yesterday", "variant": "96GB", "site": "SiteA", "price": None, "error": "Timeout"}
+        record = PriceRecord.from_dict(data)
+        self.assertIsNone(record.ts)
+        self.assertEqual(record.to_dict(), data)
+
+    def test_aware_timestamp_written_back_unchanged(self):
+        data = {"timestamp": "2024-01-01T11:00:00+01:00", "variant": "96GB", "site": "SiteA", "price": 1000}
+        record = PriceRecord.from_dict(data)
+        self.assertEqual(record.ts, to_epoch_us("2024-01-01T10:00:00"))
+        self.assertEqual(record.to_dict(), data)
+
+    def test_records_not_hashable(self):
+        record = PriceRecord.from_dict({"timestamp": "2024-01-01T10:00:00", "price": 1})
+        with self.assertRaises(TypeError):
+            hash(record)
+
+    def test_strings_interned_and_slotted(self):
+        site = "".join(["Site", "A"])
+        a = PriceRecord.from_dict({"timestamp": "2024-01-01T10:00:00", "variant": "96GB", "site": site, "price": 1})
+        b = PriceRecord.from_dict({"timestamp": "2024-01-02T10:00:00", "variant": "96GB", "site": "".join(["Site", "A"]), "price": 2})
+        self.assertIs(a.site, b.site)
+        self.assertFalse(hasattr(a, '__dict__'))
+
+    def test_iso_week_matches_isocalendar(self):
+        start = datetime.datetime(2023, 12, 20)
+        for hours in range(0, 24 * 30, 5):
+            a = start + datetime.timedelta(hours=hours)
+            b = start + datetime.timedelta(hours=hours + 37)
+            same = a.isocalendar()[:2] == b.isocalendar()[:2]
+            self.assertEqual(iso_week(to_epoch_us(a.isoformat())) == iso_week(to_epoch_us(b.isoformat())), same)
+
+if __name__ == '__main__':
+    unittest.main()
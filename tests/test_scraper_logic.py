@@ -1,7 +1,9 @@
 import unittest
+import asyncio
 import sys
 import os
-from unittest.mock import MagicMock
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Mock requests before importing scraper
 sys.modules['requests'] = MagicMock()
@@ -11,7 +13,9 @@ sys.modules['playwright.async_api'] = MagicMock()
 # Add src to python path to import scraper
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from scraper import COUPON_PATTERN
+from scraper import COUPON_PATTERN, REPLAY_SETTLE_MS, SETTLE_MS, har_path, settle_timeout, storage_state_path, known_good_path, remove_geo_modal, check_alerts, scrape_items
+from stats import PriceStatsIndex
+from records import PriceRecord, load_records
 
 class TestScraperRegex(unittest.TestCase):
     def test_coupon_regex_matches_expected_patterns(self):
@@ -46,5 +50,179 @@ class TestScraperRegex(unittest.TestCase):
         matches = COUPON_PATTERN.findall(text)
         self.assertEqual(matches, ["GMKEVO50OFF"])
 
+class TestReplayHelpers(unittest.TestCase):
+    def test_har_path_is_per_item(self):
+        item96 = {"site_name": "GMKtec Official", "target_ram": "96GB"}
+        item128 = {"site_name": "GMKtec Official", "target_ram": "128GB"}
+        self.assertEqual(har_path("hars", item96), os.path.join("hars", "gmktec-official-96gb.har"))
+        self.assertNotEqual(har_path("hars", item96), har_path("hars", item128))
+
+    def test_har_path_uses_variant_for_generic_sites(self):
+        item = {"site_name": "PcComponentes", "variant": "128 GB"}
+        self.assertEqual(har_path("hars", item), os.path.join("hars", "pccomponentes-128-gb.har"))
+
+    def test_settle_timeout_shorter_in_replay(self):
+        self.assertEqual(settle_timeout({}), SETTLE_MS)
+        self.assertEqual(settle_timeout({"replay": True}), REPLAY_SETTLE_MS)
+
+    def test_replay_closes_context_when_page_fails(self):
+        context = MagicMock()
+        context.route_from_har = AsyncMock()
+        context.new_page = AsyncMock(side_effect=RuntimeError("browser gone"))
+        context.close = AsyncMock()
+        browser = MagicMock()
+        browser.new_context = AsyncMock(return_value=context)
+        browser.close = AsyncMock()
+        p = MagicMock()
+        p.chromium.launch = AsyncMock(return_value=browser)
+        manager = MagicMock()
+        manager.__aenter__ = AsyncMock(return_value=p)
+        manager.__aexit__ = AsyncMock(return_value=False)
+
+        item = {"site_name": "GMKtec Official", "target_ram": "96GB", "url": "http://example.com"}
+        with patch('scraper.async_playwright', return_value=manager), \
+                patch('scraper.StrategyCache.load') as load:
+            results = asyncio.run(scrape_items([item], replay_dir="tests/har"))
+
+        self.assertEqual(results, [])
+        context.close.assert_awaited_once()
+        # Replays never read the learned strategies
+        load.assert_not_called()
+
+class TestStorageState(unittest.TestCase):
+    def test_storage_state_path_per_site(self):
+        self.assertEqual(storage_state_path("GMKtec Official", "state"), os.path.join("state", "gmktec-official.json"))
+
+    def test_known_good_marker_per_site(self):
+        self.assertEqual(known_good_path("GMKtec Official", "state"), os.path.join("state", "gmktec-official.known-good"))
+
+    def test_known_state_skips_blocker_wait(self):
+        page = MagicMock()
+        page.wait_for_selector = AsyncMock()
+        page.evaluate = AsyncMock(return_value={"geo": False, "dismissed": False, "removed": 0})
+
+        found = asyncio.run(remove_geo_modal(page, timeout=0))
+
+        self.assertFalse(found)
+        page.wait_for_selector.assert_not_called()
+        page.evaluate.assert_awaited_once()
+
+    def test_blocker_reported_when_geo_modal_present(self):
+        page = MagicMock()
+        page.wait_for_selector = AsyncMock()
+        page.evaluate = AsyncMock(return_value={"geo": True, "dismissed": True, "removed": 1})
+
+        found = asyncio.run(remove_geo_modal(page, timeout=SETTLE_MS))
+
+        self.assertTrue(found)
+        page.wait_for_selector.assert_awaited_once()
+
+    def test_generic_overlays_not_reported(self):
+        # Themes that always render a hidden backdrop must not count as a blocker
+        page = MagicMock()
+        page.wait_for_selector = AsyncMock()
+        page.evaluate = AsyncMock(return_value={"geo": False, "dismissed": False, "removed": 1})
+
+        self.assertFalse(asyncio.run(remove_geo_modal(page, timeout=0)))
+
+    def run_with_state(self, state_dir, blocker_seen, checked=True):
+        page = MagicMock()
+        page.close = AsyncMock()
+        context = MagicMock()
+        context.new_page = AsyncMock(return_value=page)
+        context.storage_state = AsyncMock()
+        browser = MagicMock()
+        browser.new_context = AsyncMock(return_value=context)
+        browser.close = AsyncMock()
+        p = MagicMock()
+        p.chromium.launch = AsyncMock(return_value=browser)
+        manager = MagicMock()
+        manager.__aenter__ = AsyncMock(return_value=p)
+        manager.__aexit__ = AsyncMock(return_value=False)
+
+        seen = {}
+
+        async def fake_scrape(page, item, strategies=None, product_pages=None):
+            seen['known_good'] = item['storage_state_known_good']
+            if checked:
+                item['blocker_checked'] = True
+            if blocker_seen:
+                item['blocker_seen'] = True
+            return None
+
+        item = {"site_name": "GMKtec Official", "target_ram": "96GB", "url": "http://example.com"}
+        with patch('scraper.async_playwright', return_value=manager), \
+                patch('scraper.scrape_site', new=fake_scrape), \
+                patch('scraper.StrategyCache.save'):
+            asyncio.run(scrape_items([item], state_dir=state_dir, strategy_file=os.path.join(state_dir, "s.json")))
+        return seen['known_good'], context.storage_state
+
+    def test_state_known_good_after_clean_run(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = storage_state_path("GMKtec Official", state_dir)
+            marker = known_good_path("GMKtec Official", state_dir)
+
+            # Fresh run: saved, but not trusted yet
+            known_good, save = self.run_with_state(state_dir, blocker_seen=True)
+            self.assertFalse(known_good)
+            save.assert_awaited_once_with(path=state)
+            self.assertFalse(os.path.exists(marker))
+
+            open(state, 'w').close()
+            # A run that loaded it without blockers makes it known-good
+            known_good, _ = self.run_with_state(state_dir, blocker_seen=False)
+            self.assertFalse(known_good)
+            self.assertTrue(os.path.exists(marker))
+
+            known_good, _ = self.run_with_state(state_dir, blocker_seen=False)
+            self.assertTrue(known_good)
+
+    def test_reappearing_blocker_saves_new_state(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = storage_state_path("GMKtec Official", state_dir)
+            marker = known_good_path("GMKtec Official", state_dir)
+            open(state, 'w').close()
+            open(marker, 'w').close()
+
+            known_good, save = self.run_with_state(state_dir, blocker_seen=True)
+
+            self.assertTrue(known_good)
+            save.assert_awaited_once_with(path=state)
+            self.assertFalse(os.path.exists(marker))
+
+    def test_failed_run_does_not_prove_state(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            open(storage_state_path("GMKtec Official", state_dir), 'w').close()
+            marker = known_good_path("GMKtec Official", state_dir)
+
+            # No page got past the blocker check (e.g. goto timed out)
+            self.run_with_state(state_dir, blocker_seen=False, checked=False)
+
+            self.assertFalse(os.path.exists(marker))
+
+class TestAlerts(unittest.TestCase):
+    def setUp(self):
+        self.items = [{"site_name": "SiteA", "target_ram": "96GB", "target_price": 900}]
+        self.stats = PriceStatsIndex.build(load_records([
+            {"timestamp": "2024-01-01T10:00:00", "variant": "96GB", "site": "SiteA", "price": 1000},
+        ]))
+
+    def run_alerts(self, price):
+        record = PriceRecord.from_dict({"timestamp": "2024-01-02T10:00:00", "variant": "96GB", "site": "SiteA", "price": price})
+        with patch('scraper.send_telegram_alert', new=AsyncMock()) as alert:
+            asyncio.run(check_alerts(self.items, [record], self.stats))
+        return alert
+
+    def test_new_all_time_low_alerts_above_target(self):
+        alert = self.run_alerts(950)
+        alert.assert_awaited_once()
+        self.assertEqual(self.stats.get("SiteA", "96GB").all_time_min["price"], 950)
+
+    def test_no_alert_above_previous_low(self):
+        self.run_alerts(1050).assert_not_called()
+
+    def test_target_price_alerts(self):
+        self.run_alerts(850).assert_awaited_once()
+
 if __name__ == '__main__':
     unittest.main()
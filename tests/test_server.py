@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import json
+import gzip
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+
+# Add src to python path to import server
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from server import PriceIndex, downsample, make_server
+
+def make_history(n, site="SiteA", variant="96GB"):
+    return [
+        {
+            "timestamp": f"2024-01-{1 + i // 24:02d}T{i % 24:02d}:00:00",
+            "variant": variant,
+            "site": site,
+            "price": 1000 + (i % 7) * 10,
+            "url": "http://example.com"
+        }
+        for i in range(n)
+    ]
+
+class TestDownsample(unittest.TestCase):
+    def test_downsample_limits_points(self):
+        points = [(i, str(i), 1000 + i % 13) for i in range(1000)]
+        reduced = downsample(points, 100)
+        self.assertLessEqual(len(reduced), 100)
+
+    def test_downsample_keeps_extremes(self):
+        points = [(i, str(i), 1000) for i in range(1000)]
+        points[437] = (437, "437", 800)
+        points[812] = (812, "812", 1500)
+        reduced = downsample(points, 50)
+        self.assertIn(points[437], reduced)
+        self.assertIn(points[812], reduced)
+        self.assertEqual([p[0] for p in reduced], sorted(p[0] for p in reduced))
+
+    def test_downsample_small_series_untouched(self):
+        points = [(i, str(i), 1000) for i in range(10)]
+        self.assertEqual(downsample(points, 100), points)
+
+    def test_downsample_never_unbounded(self):
+        points = [(i, str(i), 1000 + i % 13) for i in range(1000)]
+        for max_points in (0, -1, 1):
+            self.assertEqual(len(downsample(points, max_points)), 2)
+
+class TestPriceIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump(make_history(48) + make_history(48, variant="128GB"), self.tmp)
+        self.tmp.close()
+        self.index = PriceIndex(self.tmp.name)
+
+    def tearDown(self):
+        os.unlink(self.tmp.name)
+
+    def test_query_filters_series_and_range(self):
+        result = self.index.snapshot().query_series(
+            variant="96GB",
+            start="2024-01-01T12:00:00",
+            end="2024-01-02T11:00:00"
+        )
+        self.assertEqual(len(result["series"]), 1)
+        series = result["series"][0]
+        self.assertEqual(series["variant"], "96GB")
+        self.assertEqual(series["count"], 24)
+        self.assertEqual(series["points"][0]["x"], "2024-01-01T12:00:00")
+        self.assertEqual(series["points"][-1]["x"], "2024-01-02T11:00:00")
+
+    def test_etag_changes_on_write(self):
+        etag = self.index.refresh()
+        self.assertEqual(self.index.refresh(), etag)
+
+        with open(self.tmp.name, 'w') as f:
+            json.dump(make_history(10), f)
+        os.utime(self.tmp.name, ns=(0, 1))
+
+        self.assertNotEqual(self.index.refresh(), etag)
+        self.assertEqual(self.index.snapshot().query_records(limit=100)["total"], 10)
+
+    def test_snapshot_keeps_etag_and_data_together(self):
+        snapshot = self.index.snapshot()
+        with open(self.tmp.name, 'w') as f:
+            json.dump(make_history(10), f)
+        os.utime(self.tmp.name, ns=(0, 1))
+
+        # A reload does not alter a snapshot already handed out
+        self.assertNotEqual(self.index.snapshot().etag, snapshot.etag)
+        self.assertEqual(snapshot.query_records(limit=200)["total"], 96)
+
+    def test_records_newest_first(self):
+        page = self.index.snapshot().query_records(offset=0, limit=5)
+        self.assertEqual(page["total"], 96)
+        timestamps = [r["timestamp"] for r in page["records"]]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.dir.name, 'prices.json')
+        with open(self.data_file, 'w') as f:
+            json.dump(make_history(500), f)
+        with open(os.path.join(self.dir.name, 'stats.json'), 'w') as f:
+            json.dump({"version": 2, "series": []}, f)
+        self.server = make_server(port=0, data_file=self.data_file)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_series_gzip_and_not_modified(self):
+        req = urllib.request.Request(self.base + "/api/series?max_points=50", headers={"Accept-Encoding": "gzip"})
+        with urllib.request.urlopen(req) as resp:
+            self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+            etag = resp.headers["ETag"]
+            body = json.loads(gzip.decompress(resp.read()))
+        self.assertLessEqual(len(body["series"][0]["points"]), 50)
+        self.assertEqual(body["series"][0]["count"], 500)
+
+        req = urllib.request.Request(self.base + "/api/series?max_points=50", headers={"If-None-Match": etag})
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            urllib.request.urlopen(req)
+        self.assertEqual(ctx.exception.code, 304)
+
+    def test_series_max_points_clamped(self):
+        with urllib.request.urlopen(self.base + "/api/series?max_points=0") as resp:
+            body = json.loads(resp.read())
+        self.assertEqual(len(body["series"][0]["points"]), 2)
+
+    def test_stats_served_next_to_data_file(self):
+        with urllib.request.urlopen(self.base + "/data/stats.json") as resp:
+            self.assertEqual(json.loads(resp.read()), {"version": 2, "series": []})
+
+if __name__ == '__main__':
+    unittest.main()
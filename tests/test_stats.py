@@ -0,0 +1,90 @@
+import unittest
+import datetime
+import sys
+import os
+import tempfile
+
+# Add src to python path to import stats
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from stats import PriceStatsIndex, SeriesStats, load_stats, save_stats
+from records import PriceRecord, load_records
+
+class TestSeriesStats(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime.datetime(2024, 1, 1, 10, 0, 0)
+
+    def ts(self, days):
+        return (self.start + datetime.timedelta(days=days)).isoformat()
+
+    def test_rolling_minimums_expire(self):
+        stats = SeriesStats("SiteA", "96GB")
+        stats.update(self.ts(0), 900)     # all-time low, expires from every window
+        stats.update(self.ts(69), 1000)   # expires from 7d and 30d
+        stats.update(self.ts(92), 1100)   # expires from 7d
+        stats.update(self.ts(100), 1200)
+
+        self.assertEqual(stats.all_time_min["price"], 900)
+        self.assertEqual(stats.rolling_min(7)["price"], 1200)
+        self.assertEqual(stats.rolling_min(30)["price"], 1100)
+        self.assertEqual(stats.rolling_min(90)["price"], 1000)
+        self.assertEqual(stats.last["price"], 1200)
+
+    def test_monotonic_window_stays_small(self):
+        stats = SeriesStats("SiteA", "96GB")
+        for i in range(200):
+            stats.update(self.ts(i / 24), 2000 - i)
+        # Strictly decreasing prices: each record evicts all previous ones
+        self.assertEqual(len(stats.windows[90]), 1)
+
+    def test_new_low_and_change_counts(self):
+        stats = SeriesStats("SiteA", "96GB")
+        self.assertFalse(stats.update(self.ts(0), 1000))  # First record is not a "new" low
+        self.assertFalse(stats.update(self.ts(1), 1000))
+        self.assertTrue(stats.update(self.ts(2), 950))
+        self.assertFalse(stats.update(self.ts(3), 1050))
+        self.assertEqual((stats.changes, stats.drops, stats.rises), (2, 1, 1))
+        self.assertEqual(stats.count, 4)
+
+    def test_invalid_records_ignored(self):
+        stats = SeriesStats("SiteA", "96GB")
+        self.assertFalse(stats.update("not a date", 1000))
+        self.assertFalse(stats.update(self.ts(0), None))
+        self.assertEqual(stats.count, 0)
+
+class TestPriceStatsIndex(unittest.TestCase):
+    def setUp(self):
+        self.history = load_records([
+            {"timestamp": "2024-01-02T10:00:00", "variant": "96GB", "site": "SiteA", "price": 1100},
+            {"timestamp": "2024-01-01T10:00:00", "variant": "96GB", "site": "SiteA", "price": 1000},
+            {"timestamp": "2024-01-01T10:00:00", "variant": "128GB", "site": "SiteA", "price": 2000},
+        ])
+
+    def test_build_matches_incremental_updates(self):
+        built = PriceStatsIndex.build(self.history)
+        incremental = PriceStatsIndex()
+        for record in sorted(self.history, key=lambda x: x.ts):
+            incremental.update(record)
+        now = datetime.datetime(2024, 1, 3)
+        self.assertEqual(built.to_dict(now), incremental.to_dict(now))
+        self.assertEqual(built.get("SiteA", "96GB").last["price"], 1100)
+
+    def test_round_trip_through_file(self):
+        index = PriceStatsIndex.build(self.history)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stats.json")
+            save_stats(index, path)
+            loaded = load_stats([], path)
+            # Keeps ingesting where the saved index stopped
+            self.assertTrue(loaded.update(PriceRecord.from_dict(
+                {"timestamp": "2024-01-03T10:00:00", "variant": "96GB", "site": "SiteA", "price": 990}
+            )))
+            self.assertEqual(loaded.get("SiteA", "96GB").rolling_min(7)["price"], 990)
+
+    def test_missing_file_rebuilds_from_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            loaded = load_stats(self.history, os.path.join(tmp, "missing.json"))
+        self.assertEqual(loaded.get("SiteA", "128GB").all_time_min["price"], 2000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import asyncio
+import sys
+import os
+import tempfile
+
+# Add src to python path to import strategies
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from strategies import STALE_AFTER, StrategyCache
+
+def step(result, calls, name):
+    async def run():
+        calls.append(name)
+        return result
+    return run
+
+class TestStrategyCache(unittest.TestCase):
+    def run_steps(self, cache, results, probe=()):
+        calls = []
+        steps = {name: step(result, calls, name) for name, result in results.items()}
+        outcome = asyncio.run(cache.run("SiteA", "variant", steps, probe))
+        return outcome, calls
+
+    def test_default_order_until_success(self):
+        cache = StrategyCache()
+        outcome, calls = self.run_steps(cache, {"structured": None, "label": True, "radio": True})
+        self.assertEqual(outcome, ("label", True))
+        self.assertEqual(calls, ["structured", "label"])
+        self.assertFalse(cache.layout_changed("SiteA", {"variant": outcome[0]}))
+
+    def test_last_winner_tried_first(self):
+        cache = StrategyCache()
+        self.run_steps(cache, {"structured": None, "label": None, "radio": True})
+        outcome, calls = self.run_steps(cache, {"structured": None, "label": None, "radio": True})
+        self.assertEqual(calls, ["radio"])
+        self.assertEqual(outcome[0], "radio")
+
+    def test_stale_strategies_tried_last(self):
+        cache = StrategyCache({"SiteA": {"variant": {"winner": "label", "failures": {"structured": STALE_AFTER}}}})
+        # Winner now fails: the stale 'structured' goes after 'radio'
+        outcome, calls = self.run_steps(cache, {"structured": True, "label": None, "radio": None})
+        self.assertEqual(calls, ["label", "radio", "structured"])
+        self.assertEqual(outcome[0], "structured")
+        self.assertTrue(cache.layout_changed("SiteA", {"variant": outcome[0]}))
+
+    def test_probe_tried_before_last_winner(self):
+        cache = StrategyCache({"SiteA": {"variant": {"winner": "label", "failures": {"structured": 1}}}})
+        outcome, calls = self.run_steps(cache, {"structured": True, "label": True}, probe=("structured",))
+        self.assertEqual(calls, ["structured"])
+        self.assertEqual(outcome[0], "structured")
+
+    def test_precise_probe_not_displaced_by_fallback(self):
+        cache = StrategyCache()
+        calls = []
+        steps = {"subtotal": step(None, calls, "subtotal"), "product_area": step(1999.0, calls, "product_area")}
+        asyncio.run(cache.run("SiteA", "price:96GB", steps, probe=("subtotal",)))
+        # The fallback won once, but the exact read is still tried first
+        steps["subtotal"] = step(1859.0, calls, "subtotal")
+        outcome = asyncio.run(cache.run("SiteA", "price:96GB", steps, probe=("subtotal",)))
+        self.assertEqual(outcome, ("subtotal", 1859.0))
+        self.assertEqual(calls, ["subtotal", "product_area", "subtotal"])
+
+    def test_layout_change_judged_against_loaded_winner(self):
+        cache = StrategyCache({"SiteA": {"variant": {"winner": "label", "failures": {}}}})
+        # An earlier item already switched the winner during this run...
+        self.run_steps(cache, {"structured": None, "label": None, "radio": True})
+        # ...but each item is flagged by its own result
+        self.assertTrue(cache.layout_changed("SiteA", {"variant": "radio"}))
+        self.assertFalse(cache.layout_changed("SiteA", {"variant": "label"}))
+        self.assertFalse(cache.layout_changed("SiteB", {"variant": "radio"}))
+
+    def test_all_fail(self):
+        cache = StrategyCache()
+        outcome, calls = self.run_steps(cache, {"structured": None, "label": None})
+        self.assertEqual(outcome, (None, None))
+        self.assertEqual(len(calls), 2)
+
+    def test_persisted_between_runs(self):
+        cache = StrategyCache()
+        self.run_steps(cache, {"structured": None, "label": True})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "strategies.json")
+            cache.save(path)
+            loaded = StrategyCache.load(path)
+        self.assertEqual(loaded.order("SiteA", "variant", ["structured", "label"]), ["label", "structured"])
+        self.assertIn("ms", loaded.sites["SiteA"]["variant"])
+
+    def test_missing_file_starts_empty(self):
+        self.assertEqual(StrategyCache.load("/nonexistent/strategies.json").sites, {})
+
+if __name__ == '__main__':
+    unittest.main()
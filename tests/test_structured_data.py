@@ -0,0 +1,121 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+# Mock requests before importing scraper
+sys.modules['requests'] = MagicMock()
+sys.modules['playwright'] = MagicMock()
+sys.modules['playwright.async_api'] = MagicMock()
+
+# Add src to python path to import scraper
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from scraper import normalize_structured_variants, match_structured_variant, scrape_gmktec_official
+from strategies import StrategyCache
+
+SOURCES = [
+    {"kind": "shopify", "variants": [
+        {"title": "96GB+2TB", "options": ["96GB+2TB"], "price": 185900},
+        {"title": "128GB+2TB", "options": ["128GB+2TB"], "price": 245900},
+    ]},
+    {"kind": "jsonld", "variants": [
+        {"title": "96GB+2TB", "options": [], "price": "1999.00"},
+        {"title": "64GB+1TB", "options": [], "price": "1499.00"},
+    ]},
+]
+
+class TestStructuredVariants(unittest.TestCase):
+    def test_normalize_converts_cents_and_dedupes(self):
+        variants = normalize_structured_variants(SOURCES)
+        self.assertEqual(variants, [
+            ("96GB+2TB 96GB+2TB", 1859.0),
+            ("128GB+2TB 128GB+2TB", 2459.0),
+            ("96GB+2TB", 1999.0),
+            ("64GB+1TB", 1499.0),
+        ])
+
+    def test_normalize_skips_incomplete_entries(self):
+        sources = [{"kind": "jsonld", "variants": [{"title": "", "price": "10"}, {"title": "X", "price": None}]}]
+        self.assertEqual(normalize_structured_variants(sources), [])
+        self.assertEqual(normalize_structured_variants(None), [])
+
+    def test_match_by_target_ram(self):
+        variants = normalize_structured_variants(SOURCES)
+        self.assertEqual(match_structured_variant(variants, {"target_ram": "128 GB"}), 2459.0)
+        self.assertIsNone(match_structured_variant(variants, {"target_ram": "32GB"}))
+
+    def test_match_by_configured_pattern(self):
+        variants = normalize_structured_variants(SOURCES)
+        item = {"target_ram": "64GB", "variant_pattern": r"^64gb\+1tb$"}
+        self.assertEqual(match_structured_variant(variants, item), 1499.0)
+
+    def test_invalid_pattern_falls_back_to_target_ram(self):
+        variants = normalize_structured_variants(SOURCES)
+        item = {"target_ram": "128GB", "variant_pattern": r"128GB+("}
+        self.assertEqual(match_structured_variant(variants, item), 2459.0)
+
+def make_page():
+    page = MagicMock()
+    page.goto = AsyncMock()
+    page.wait_for_timeout = AsyncMock()
+    # remove_geo_modal, the structured data read, then the late blocker check
+    no_blocker = {"geo": False, "dismissed": False, "removed": 0}
+    page.evaluate = AsyncMock(side_effect=[no_blocker, SOURCES, no_blocker])
+    page.query_selector_all = AsyncMock()
+    page.inner_text = AsyncMock(return_value="Use GMKEVO50OFF at checkout")
+    return page
+
+class TestStructuredScrape(unittest.TestCase):
+    def test_structured_price_skips_clicking(self):
+        page = make_page()
+
+        item = {"url": "http://example.com", "target_ram": "96GB", "site_name": "GMKtec Official",
+                "storage_state_known_good": True}
+        record = asyncio.run(scrape_gmktec_official(page, item))
+
+        self.assertEqual(record["metadata"]["base_price"], 1859.0)
+        self.assertEqual(record["price"], 1809.0)
+        page.query_selector_all.assert_not_called()
+        page.wait_for_timeout.assert_not_called()
+        self.assertNotIn("blocker_seen", item)
+        self.assertTrue(item["blocker_checked"])
+
+    def test_strategies_learned_per_variant(self):
+        # Another variant of the same site is only found by clicking: that is not a layout change here
+        strategies = StrategyCache({"GMKtec Official": {"variant:32GB": {"winner": "label", "failures": {}}}})
+        item = {"url": "http://example.com", "target_ram": "96GB", "site_name": "GMKtec Official",
+                "storage_state_known_good": True}
+
+        record = asyncio.run(scrape_gmktec_official(make_page(), item, strategies))
+
+        self.assertFalse(record["metadata"]["layout_changed"])
+        self.assertEqual(strategies.sites["GMKtec Official"]["variant:96GB"]["winner"], "structured")
+        self.assertEqual(strategies.sites["GMKtec Official"]["variant:32GB"]["winner"], "label")
+
+    def test_items_on_same_page_share_one_load(self):
+        first, second = make_page(), make_page()
+        items = [
+            {"url": "http://example.com", "target_ram": ram, "site_name": "GMKtec Official",
+             "storage_state_known_good": True}
+            for ram in ("96GB", "128GB")
+        ]
+
+        async def scrape_both():
+            product_pages = {}
+            return await asyncio.gather(
+                scrape_gmktec_official(first, items[0], product_pages=product_pages),
+                scrape_gmktec_official(second, items[1], product_pages=product_pages),
+            )
+
+        records = asyncio.run(scrape_both())
+
+        self.assertEqual([r["metadata"]["base_price"] for r in records], [1859.0, 2459.0])
+        self.assertEqual(records[1]["price"], 2409.0)
+        first.goto.assert_awaited_once()
+        second.goto.assert_not_called()
+        second.evaluate.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()